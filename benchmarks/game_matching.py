@@ -0,0 +1,103 @@
+import random
+import re
+import string
+import sys
+import timeit
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(__file__), '..', 'src'))
+
+from utils.gamematch import GameIndex
+
+# -------------------------> Globals
+
+threshold = 85  # Ratio letsplay accepts as a match
+
+# -------------------------> Functions
+
+# The two-row levenshtein letsplay used before the game index
+def legacy_levenshtein(a: str, b: str) -> int:
+	prev = [i for i in range(len(b) + 1)]
+	curr = [0 for _ in range(len(b) + 1)]
+
+	for i in range(len(a)):
+		curr[0] = i + 1
+		for j in range(len(b)):
+			del_cost = prev[j + 1] + 1
+			ins_cost = curr[j] + 1
+			sub_cost = prev[j]
+			if a[i] != b[j]:
+				sub_cost += 1
+
+			curr[j + 1] = min(del_cost, ins_cost, sub_cost)
+
+		for j in range(len(curr)):
+			prev[j] = curr[j]
+
+	return 100 - 100 * prev[len(b)] // max(len(a), len(b))
+
+# The brute force matcher letsplay used before, including building the aliases on every call
+def legacy_choose_one(query: str, games: dict) -> dict:
+	collection = []
+	for appid, name in games.items():
+		collection.append({'name': name, 'appid': appid, 'alias': name})
+		collection.append({'name': name, 'appid': appid, 'alias': ''.join([word[0] for word in re.findall(r"[\w]+", name)])})
+
+	query = query.lower()
+	best_match = None
+	best_ratio = None
+	for item in collection:
+		ratio = legacy_levenshtein(query, item['alias'].lower())
+		if best_ratio == None or ratio > best_ratio:
+			best_ratio = ratio
+			best_match = item
+	return {'match': best_match, 'ratio': best_ratio}
+
+# Builds a library of made up game names
+def synthetic_library(size: int, rng: random.Random) -> dict:
+	words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))).capitalize() for _ in range(800)]
+	return {appid: ' '.join(rng.choices(words, k=rng.randint(1, 4))) for appid in rng.sample(range(10 ** 6), size)}
+
+# Queries as people type them: exact names, names with a typo, acronyms and nonsense
+def synthetic_queries(games: dict, amount: int, rng: random.Random) -> list:
+	names, queries = list(games.values()), []
+	for i in range(amount):
+		name = rng.choice(names)
+		if i % 4 == 0:
+			queries.append(name)
+		elif i % 4 == 1:
+			position = rng.randrange(len(name))
+			queries.append(name[:position] + rng.choice(string.ascii_lowercase) + name[position + 1:])
+		elif i % 4 == 2:
+			queries.append(''.join(word[0] for word in name.split()))
+		else:
+			queries.append(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12))))
+	return queries
+
+# -------------------------> Main
+
+# Usage: python benchmarks/game_matching.py [library size] [queries]
+if __name__ == '__main__':
+	size = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+	amount = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+	rng = random.Random(42)
+	games = synthetic_library(size, rng)
+	queries = synthetic_queries(games, amount, rng)
+
+	build = min(timeit.repeat(lambda: GameIndex(games), number=1, repeat=3))
+	index = GameIndex(games)
+	legacy = min(timeit.repeat(lambda: [legacy_choose_one(query, games) for query in queries], number=1, repeat=3))
+	indexed = min(timeit.repeat(lambda: [index.choose_one(query) for query in queries], number=1, repeat=3))
+
+	# Both matchers should accept the same queries, as the same game
+	agree = 0
+	for query in queries:
+		old, new = legacy_choose_one(query, games), index.choose_one(query)
+		old_hit = old['match']['appid'] if old['ratio'] >= threshold else None
+		new_hit = new['match']['appid'] if new['match'] and new['ratio'] >= threshold else None
+		agree += old_hit == new_hit
+
+	print(f'  index build: {build * 1e3:8.2f} ms once per fetched library ({size} games)')
+	print(f'       legacy: {legacy * 1e3 / amount:8.2f} ms/query')
+	print(f'      indexed: {indexed * 1e3 / amount:8.2f} ms/query')
+	print(f'    agreement: {agree}/{amount} queries matched the same game')
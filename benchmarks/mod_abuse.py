@@ -0,0 +1,77 @@
+import json
+import random
+import string
+import sys
+import timeit
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(__file__), '..', 'src'))
+
+from utils.triggers import TriggerEngine
+
+# -------------------------> Globals
+
+config_path = path.join(path.dirname(__file__), '..', 'storage-template', 'config', 'replies.json')
+with open(config_path, 'r', encoding='utf-8') as file:
+	peace_items = json.load(file)['peace_items']
+
+# -------------------------> Functions
+
+# The detector as it was before the trigger engine, scanning once per keyword
+def legacy_detector(content: str) -> bool:
+	mod_flag, abuse_flag = False, False
+	for mod in peace_items[0]:
+		if mod in content:
+			mod_flag = True
+	for abuse in peace_items[1]:
+		if abuse in content:
+			abuse_flag = True
+	return abuse_flag and mod_flag
+
+# Per message: the current message, then the current message with the previous one of the same author
+def legacy(corpus: list) -> int:
+	caught, previous = 0, None
+	for content in corpus:
+		if legacy_detector(content) or (previous is not None and legacy_detector(content + ' ' + previous)):
+			caught += 1
+		previous = content
+	return caught
+
+# Per message: a single scan, the previous message is remembered by its categories
+def engine(corpus: list, triggers: TriggerEngine) -> int:
+	caught, previous = 0, frozenset()
+	for content in corpus:
+		categories = frozenset(('mod', 'abuse')).intersection(triggers.scan(content))
+		if 'mod' in categories | previous and 'abuse' in categories | previous:
+			caught += 1
+		previous = categories
+	return caught
+
+# Builds chat-like messages, a small share of them containing peace items
+def synthetic_corpus(size: int, seed: int = 42) -> list:
+	rng = random.Random(seed)
+	words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(2000)]
+	corpus = []
+	for _ in range(size):
+		message = rng.choices(words, k=rng.randint(1, 25))
+		if rng.random() < 0.05:
+			message.insert(rng.randrange(len(message) + 1), rng.choice(peace_items[rng.randrange(2)]))
+		corpus.append(' '.join(message))
+	return corpus
+
+# -------------------------> Main
+
+# Usage: python benchmarks/mod_abuse.py [messages] [extra keywords per list]
+if __name__ == '__main__':
+	size = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+	extra = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+	rng = random.Random(7)
+	for items in peace_items:  # Grows the keyword lists to show how both detectors scale
+		items += [''.join(rng.choices(string.ascii_lowercase, k=8)) for _ in range(extra)]
+	corpus = synthetic_corpus(size)
+	triggers = TriggerEngine().add('mod', peace_items[0]).add('abuse', peace_items[1]).compile()
+	assert legacy(corpus) == engine(corpus, triggers), 'Detectors disagree'
+
+	for name, run in [('legacy', lambda: legacy(corpus)), ('engine', lambda: engine(corpus, triggers))]:
+		best = min(timeit.repeat(run, number=1, repeat=5))
+		print(f'{name:>8}: {best * 1e6 / size:6.2f} µs/message ({size} messages, {len(peace_items[0]) + len(peace_items[1])} keywords)')
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import path
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, path.join(path.dirname(__file__), '..', 'src'))
+
+from utils.steamlib import LibraryCache
+
+# -------------------------> Globals
+
+latency = 0.2  # Seconds the stub takes per GetOwnedGames call, roughly a real round-trip
+users = 50
+games_per_user = 500
+
+# -------------------------> Classes
+
+# Local stand-in for IPlayerService/GetOwnedGames, every steam id owns a deterministic random set of games
+class StubWebAPI(BaseHTTPRequestHandler):
+	calls = 0
+
+	def do_GET(self):
+		StubWebAPI.calls += 1
+		steam_id = parse_qs(urlparse(self.path).query)['steamid'][0]
+		rng = random.Random(steam_id)
+		games = [{'appid': appid, 'name': f'Game {appid}'} for appid in rng.sample(range(10000), games_per_user)]
+		time.sleep(latency)
+
+		body = json.dumps({'response': {'game_count': len(games), 'games': games}}).encode('utf-8')
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, *args):
+		pass
+
+# -------------------------> Main
+
+# Usage: python benchmarks/steam_libraries.py
+if __name__ == '__main__':
+	server = ThreadingHTTPServer(('127.0.0.1', 0), StubWebAPI)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	url = f'http://127.0.0.1:{server.server_port}/IPlayerService/GetOwnedGames/v1/'
+
+	def fetch(steam_id: str) -> list:
+		with urllib.request.urlopen(f'{url}?steamid={steam_id}') as response:
+			return json.load(response)['response'].get('games', [])
+
+	async def main():
+		steam_ids = [str(76561198000000000 + i) for i in range(users)]
+		cache = LibraryCache(fetch, concurrency=16)
+
+		start = time.perf_counter()
+		for steam_id in steam_ids:  # How letsplay used to do it, one call after another
+			fetch(steam_id)
+		print(f'  sequential: {time.perf_counter() - start:6.2f}s for {users} libraries')
+
+		for label in ('cold cache', 'warm cache'):
+			calls, start = StubWebAPI.calls, time.perf_counter()
+			libraries = await cache.get_many(steam_ids)
+			print(f'  {label}: {time.perf_counter() - start:6.2f}s for {len(libraries)} libraries, {StubWebAPI.calls - calls} API calls')
+		cache.close()
+
+	asyncio.run(main())
+	server.shutdown()
@@ -0,0 +1,242 @@
+import asyncio
+import itertools
+import sys
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(__file__), '..', 'src'))
+
+from utils.vcroles import Debouncer, RateLimiter, apply, observe, plan
+
+# -------------------------> Globals
+
+vc_suffix = '-VC'
+members = 60
+channel_names = ['General', 'Gaming', 'Study', 'Music', 'AFK']
+gateway_delay = 0.02  # Seconds before a created role shows up in the guild cache, py-cord only adds it on GUILD_ROLE_CREATE
+ids = itertools.count(1000)
+
+# -------------------------> Classes
+
+# What discord raises once a rate limit bucket is exhausted
+class RateLimited(Exception):
+	status = 429
+	retry_after = 0.01
+
+# In-memory guild that counts every call that would have been a REST request
+class FakeGuild:
+	def __init__(self, limit_every: int = 0):
+		self.id = next(ids)
+		self.calls = 0
+		self.limited = 0
+		self.limit_every = limit_every  # Answer every nth request with a 429, 0 never does
+		self.everyone = FakeRole(self, self.id, '@everyone')
+		self.role_map = {}
+		self.members = {}
+		self.channels = {}
+
+	def request(self) -> None:
+		self.calls += 1
+		if self.limit_every and self.calls % self.limit_every == 0:
+			self.limited += 1
+			raise RateLimited
+
+	@property
+	def roles(self) -> list:
+		return [self.everyone] + list(self.role_map.values())
+
+	@property
+	def voice_channels(self) -> list:
+		return list(self.channels.values())
+
+	def get_role(self, role_id: int):
+		return self.role_map.get(role_id)
+
+	def get_member(self, member_id: int):
+		return self.members.get(member_id)
+
+	def get_channel(self, channel_id: int):
+		return self.channels.get(channel_id)
+
+	async def create_role(self, name: str, **kwargs):
+		self.request()
+		role = FakeRole(self, next(ids), name)
+		asyncio.get_running_loop().call_later(gateway_delay, self.cache_role, role)
+		return role
+
+	def cache_role(self, role) -> None:
+		if not role.deleted:
+			self.role_map[role.id] = role
+
+class FakeRole:
+	def __init__(self, guild: FakeGuild, role_id: int, name: str):
+		self.guild, self.id, self.name = guild, role_id, name
+		self.mentionable = True
+		self.deleted = False
+
+	@property
+	def members(self) -> list:
+		return [member for member in self.guild.members.values() if self in member.role_set]
+
+	async def delete(self, **kwargs):
+		self.guild.request()
+		self.deleted = True
+		self.guild.role_map.pop(self.id, None)
+		for member in self.guild.members.values():
+			member.role_set.discard(self)
+
+class FakeChannel:
+	def __init__(self, guild: FakeGuild, name: str):
+		self.guild, self.id, self.name = guild, next(ids), name
+
+	@property
+	def members(self) -> list:
+		return [member for member in self.guild.members.values() if member.voice and member.voice.channel is self]
+
+class FakeVoiceState:
+	def __init__(self, channel: FakeChannel):
+		self.channel = channel
+
+class FakeMember:
+	def __init__(self, guild: FakeGuild):
+		self.guild, self.id = guild, next(ids)
+		self.role_set = set()
+		self.voice = None
+
+	@property
+	def roles(self) -> list:
+		return [self.guild.everyone] + sorted(self.role_set, key=lambda role: role.id)
+
+	async def add_roles(self, *roles, **kwargs):
+		self.guild.request()
+		self.role_set.update(roles)
+
+	async def remove_roles(self, *roles, **kwargs):
+		self.guild.request()
+		self.role_set.difference_update(roles)
+
+	async def edit(self, roles: list, **kwargs):
+		self.guild.request()
+		self.role_set = {role for role in roles if role is not self.guild.everyone}
+
+# The on_voice_state_update and clean_up VoicePing used before reconciliation, one call after another per event
+class LegacyHandler:
+	async def compute_role_if_absent(self, name: str, guild: FakeGuild) -> FakeRole:
+		roles = {role.name: role for role in guild.roles}
+		if name + vc_suffix in roles:
+			return roles[name + vc_suffix]
+		return await guild.create_role(name=name + vc_suffix, mentionable=True)
+
+	async def clean_up(self, guild: FakeGuild) -> None:
+		roles = {role.name: role for role in guild.roles}
+		vc_channels = [vc.name for vc in guild.voice_channels]
+		for role_name in roles:
+			if role_name.replace(vc_suffix, '') not in vc_channels and vc_suffix in role_name:
+				await roles[role_name].delete()
+		for role in guild.roles:
+			if len(role.members) == 0 and role.name.endswith(vc_suffix):
+				await role.delete()
+
+	async def on_voice_state_update(self, member: FakeMember, before: FakeChannel, after: FakeChannel) -> None:
+		if after:
+			await member.add_roles(await self.compute_role_if_absent(after.name, member.guild))
+		if before and before != after:
+			await member.remove_roles(await self.compute_role_if_absent(before.name, member.guild))
+		await self.clean_up(member.guild)
+
+# The reconciliation VoicePing does now, with a short window so the simulation runs quickly
+class ReconcilingHandler:
+	def __init__(self, guild: FakeGuild):
+		self.guild = guild
+		self.mapping = {}
+		self.touched = set()
+		self.lock = asyncio.Lock()
+		self.limiter = RateLimiter(1000)
+		self.reconciler = Debouncer(self.reconcile, 0.01)
+
+	async def reconcile(self, _) -> None:
+		async with self.lock:
+			touched, self.touched = self.touched, set()
+			occupied, states = observe(self.guild, self.mapping, touched)
+			changes = plan(self.mapping, occupied, states)
+			if changes:
+				await apply(changes, self.guild, self.mapping, self.limiter, vc_suffix)
+
+	# Waits until every scheduled reconcile has run
+	async def settle(self) -> None:
+		while self.reconciler.tasks or self.lock.locked():
+			await asyncio.sleep(0.01)
+
+	async def on_voice_state_update(self, member: FakeMember, before: FakeChannel, after: FakeChannel) -> None:
+		if before != after:
+			self.touched.add(member.id)
+			self.reconciler.mark(self.guild.id)
+
+# -------------------------> Functions
+
+# Moves a member and lets the handler see the event, like the gateway would
+async def move(handler, member: FakeMember, channel: FakeChannel) -> None:
+	before = member.voice.channel if member.voice else None
+	member.voice = FakeVoiceState(channel) if channel else None
+	try:
+		await handler.on_voice_state_update(member, before, channel)
+	except RateLimited:
+		pass  # The legacy handler had no backoff, the event is simply lost
+
+# Bursts of voice events: a raid joining one channel, a mass move, people spreading out and everyone leaving
+def scenarios(guild: FakeGuild) -> list:
+	people, rooms = list(guild.members.values()), list(guild.channels.values())
+	return [
+	    ('raid join', [(member, rooms[0]) for member in people]),
+	    ('mass move', [(member, rooms[1]) for member in people]),
+	    ('spread out', [(member, rooms[i % len(rooms)]) for i, member in enumerate(people)]),
+	    ('everyone leaves', [(member, None) for member in people]),
+	]
+
+# Every member should hold exactly the role of their channel, and only occupied channels should have one
+def consistent(guild: FakeGuild) -> bool:
+	for member in guild.members.values():
+		held = {role.name for role in member.role_set}
+		expected = {member.voice.channel.name + vc_suffix} if member.voice else set()
+		if held != expected:
+			return False
+	occupied = {channel.name + vc_suffix for channel in guild.voice_channels if channel.members}
+	return {role.name for role in guild.role_map.values()} == occupied
+
+def build_guild(limit_every: int = 0) -> FakeGuild:
+	guild = FakeGuild(limit_every)
+	for name in channel_names:
+		channel = FakeChannel(guild, name)
+		guild.channels[channel.id] = channel
+	for _ in range(members):
+		member = FakeMember(guild)
+		guild.members[member.id] = member
+	return guild
+
+async def replay(make_handler, limit_every: int = 0) -> list:
+	guild = build_guild(limit_every)
+	handler, results = make_handler(guild), []
+	for label, events in scenarios(guild):
+		calls, limited = guild.calls, guild.limited
+		for member, channel in events:
+			await move(handler, member, channel)
+		if hasattr(handler, 'settle'):
+			await handler.settle()
+		await asyncio.sleep(gateway_delay * 2)  # Lets the cache catch up before checking
+		results.append((label, guild.calls - calls, guild.limited - limited, consistent(guild)))
+	return results
+
+# -------------------------> Main
+
+# Usage: python benchmarks/vc_roles.py [rate limit every nth request]
+if __name__ == '__main__':
+	limit_every = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+
+	async def main():
+		legacy = await replay(lambda guild: LegacyHandler(), limit_every)
+		reconciled = await replay(ReconcilingHandler, limit_every)
+		print(f'  {members} members, {len(channel_names)} channels' + (f', every {limit_every}th request rate limited' if limit_every else ''))
+		print(f'  {"burst":>16} │ {"legacy calls":>12} {"consistent":>10} │ {"reconciled calls":>16} {"consistent":>10}')
+		for (label, old_calls, _, old_ok), (_, new_calls, _, new_ok) in zip(legacy, reconciled):
+			print(f'  {label:>16} │ {old_calls:>12} {str(old_ok):>10} │ {new_calls:>16} {str(new_ok):>10}')
+
+	asyncio.run(main())
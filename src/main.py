@@ -1,26 +1,64 @@
 import logging as log
 from os import getenv, listdir
+from time import perf_counter
 
 import discord
 from discord.ext import commands
 from discord import ExtensionAlreadyLoaded
 from dotenv import load_dotenv
 
+from utils.dispatch import Dispatcher
+from utils.logs import setup_logging
+from utils.perf import LoopMonitor, metrics
+
+# -------------------------> Classes
+
+# Bot that times every listener, command and discord API call, and how late the event loop runs
+class TimedBot(commands.Bot):
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.monitor = LoopMonitor(metrics, export_path=getenv('PERF_PROMETHEUS'))  # Also writes the prometheus file when set
+		request = self.http.request
+
+		# Named after the route template, so /channels/{channel_id}/messages is one entry for all channels
+		async def timed_request(route, **kwargs):
+			with metrics.time('api', f'{route.method} {route.path}'):
+				return await request(route, **kwargs)
+
+		self.http.request = timed_request
+
+	async def start(self, *args, **kwargs) -> None:
+		self.monitor.start()
+		await super().start(*args, **kwargs)
+
+	# Every event handler runs through here, cog listeners included, named like Replies.on_message
+	async def _run_event(self, coro, event_name, *args, **kwargs) -> None:
+		with metrics.time('listener', getattr(coro, '__qualname__', event_name)):
+			await super()._run_event(coro, event_name, *args, **kwargs)
+
+	# Checks, hooks and the callback together, named after the subcommand that ended up running
+	async def invoke(self, ctx: commands.Context) -> None:
+		start = perf_counter()
+		try:
+			await super().invoke(ctx)
+		finally:
+			if ctx.command:
+				metrics.observe('command', ctx.command.qualified_name, perf_counter() - start)
+
 # -------------------------> Globals
 
 load_dotenv()
 intents = discord.Intents.all()
-bot = commands.Bot(command_prefix=getenv('PREFIX'), intents=intents)
+bot = TimedBot(command_prefix=getenv('PREFIX'), intents=intents)
+bot.dispatcher = Dispatcher()  # Cogs register their message handlers here instead of listening to on_message themselves
 
 # -------------------------> Logging
 
-log.basicConfig(
+setup_logging(
     level=log.INFO,
-    format='%(asctime)s [%(levelname)8s] @ %(name)-18s: %(message)s',
-    datefmt='%d/%m/%y %H:%M:%S',
-    filename='storage/discord.log',
-    filemode='w',
-    encoding='utf-8'
+    json_lines=getenv('LOG_FORMAT') == 'json',
+    fmt='%(asctime)s [%(levelname)8s] @ %(name)-18s: %(message)s',
+    datefmt='%d/%m/%y %H:%M:%S'
 )
 
 # Hide info logs that the discord module sents
@@ -36,6 +74,13 @@ async def logging(ctx: commands.Context):
 		else:
 			commandlog.debug(f"{ctx.author.name.ljust(16,' ')} | called: {str(ctx.command).ljust(12,' ')} | with: {ctx.message.content}")
 
+# Hands every message to the registered handlers once, then to the commands
+@bot.event
+async def on_message(message: discord.Message):
+	if message.author.id != bot.user.id:
+		await bot.dispatcher.dispatch(message)
+	await bot.process_commands(message)
+
 # -------------------------> Main
 
 if __name__ == '__main__':
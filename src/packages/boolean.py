@@ -1,14 +1,27 @@
+import asyncio
+import io
+import json
 import logging
-from copy import deepcopy
-from itertools import product
+from concurrent.futures import ProcessPoolExecutor
 from os.path import basename
 
-from discord.ext import commands
+import discord
+from discord.ext import commands, tasks
+
+from utils.logic import CycleError, FunctionGraph, InlineSizeError
+from utils.minimize import minimize_function
+from utils.truthtable import kmap_lines, max_map_variables, pack, table_lines, table_size
+from utils.workspaces import WorkspaceStore
 
 # -------------------------> Globals
 
 # Setup environment
 log = logging.getLogger(__name__)
+simplify_budget = 5.0  # Seconds a minimization may take before settling for the heuristic result
+max_simplify_variables = 16  # Larger functions can not even be evaluated within the budget
+max_table_variables = 16  # Larger tables get too big to even attach
+max_table_messages = 4  # Tables needing more messages than this are attached as a file instead
+max_view_size = 1800  # Longest inlined statement !b view insert shows, it has to fit in one message
 
 # -------------------------> Functions
 
@@ -27,20 +40,57 @@ def teardown(bot: commands.Bot) -> None:
 class Boolean(commands.Cog, description='Boolean logic module'):
 	def __init__(self, bot):
 		self.bot = bot
-		self.functions = {}
-
-	# Recursively inserts nested functions
-	def insert_funcs(self, func):
-		for target in func['nfnc']:
-			nfnc = self.insert_funcs(self.functions[target])  # Recurse into nested functions
-
-			# Update function properties
-			func['bvar'] += nfnc['bvar']
-			func['stmt'] = func['stmt'].replace(f'${target}', f'({nfnc["stmt"]})')
-
-		func['bvar'] = sorted(set(func['bvar']))  # Sort and filter boolean variables
-		func['nfnc'] = []  # Clear nested function set
-		return func
+		self.config = self.load_config()
+		self.workspaces = self.load_workspaces()
+		self.workers = None  # Process pool for minimization, started on first use
+		self.flush_workspaces.change_interval(seconds=self.config.get('flush_interval', 60))
+		self.flush_workspaces.start()
+
+	# Writes changed workspaces to disk when the extension stops (this includes bot shutdown)
+	def cog_unload(self):
+		self.flush_workspaces.cancel()
+		self.workspaces.flush()
+		self.stop_workers()
+
+	# Stops the minimization pool, killing a worker that is still busy so the next request gets a fresh one
+	def stop_workers(self):
+		if self.workers:
+			for process in list(getattr(self.workers, '_processes', {}).values()):
+				process.terminate()
+			self.workers.shutdown(wait=False, cancel_futures=True)
+			self.workers = None
+
+	# Updates config
+	async def update(self):
+		self.config = self.load_config()
+		self.flush_workspaces.change_interval(seconds=self.config.get('flush_interval', 60))
+		log.info(f'Boolean ran an update')
+
+	# Periodically writes changed workspaces to disk and drops idle ones from memory
+	@tasks.loop(seconds=60)
+	async def flush_workspaces(self):
+		if flushed := self.workspaces.flush():
+			log.debug(f'Flushed {flushed} boolean workspaces')
+
+	# Loads config files
+	def load_config(self):
+		log.debug(f'Loading config/boolean.json...')
+		with open('storage/config/boolean.json', 'r', encoding='utf-8') as file:
+			return json.load(file)
+
+	# Sets up the workspace store described in config/boolean.json
+	def load_workspaces(self) -> WorkspaceStore:
+		directory = self.config.get('directory', 'storage/db/boolean') if self.config.get('persist', True) else None
+		return WorkspaceStore(self.config.get('workspace_memory_size', 256), self.config.get('workspace_ttl', 3600), directory)
+
+	# Returns the functions of the author in the current guild, every member has their own
+	def load_functions(self, ctx: commands.Context) -> FunctionGraph:
+		return self.workspaces[(ctx.guild.id if ctx.guild else 0, ctx.author.id)]
+
+	# Returns a function with its nested functions inserted, the graph caches this until a dependency changes
+	def insert_funcs(self, functions: FunctionGraph, name: str) -> dict:
+		func = functions[name]
+		return {**func, 'stmt': functions.inline(name, max_view_size), 'bvar': functions.variables(name), 'nfnc': []}
 
 	# Define bool command group
 	@commands.group(brief='Subgroup for boolean logic', description='Subgroup for boolean logic.', usage='')
@@ -49,12 +99,13 @@ class Boolean(commands.Cog, description='Boolean logic module'):
 			log.warning(f'User {ctx.author.name} has passed an invalid boolean subcommand')
 			await ctx.send('Invalid boolean subcommand')
 
-	# Clears all expressions
-	@b.command(brief='Clear boolean memory', description='Clear boolean memory.', usage='')
+	# Clears all expressions of the author
+	@b.command(brief='Clear your boolean memory', description='Clear your boolean memory.', usage='')
 	async def clear(self, ctx):
 		log.debug(f'Recieved \'!b clear\' command from user \'{ctx.author.name}\'')
+		functions = self.load_functions(ctx)
 
-		self.functions = {}
+		functions.clear()
 
 		log.debug(f'Succesfully cleared all functions')
 
@@ -62,6 +113,7 @@ class Boolean(commands.Cog, description='Boolean logic module'):
 	@b.command(brief='Set a boolean value', description='Set a boolean value.', usage='x a^b')
 	async def set(self, ctx, name: str, *, expr: str):
 		log.debug(f'Recieved \'!b set\' command from user \'{ctx.author.name}\'')
+		functions = self.load_functions(ctx)
 
 		alphabet = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
 		variable = False
@@ -108,37 +160,43 @@ class Boolean(commands.Cog, description='Boolean logic module'):
 			multiply = c not in '$!*^+('
 
 		# Store results
-		self.functions[name] = {'name': name, 'expr': expr, 'stmt': stmt, 'bvar': sorted(bvar), 'nfnc': sorted(nfnc)}
+		try:
+			functions.set({'name': name, 'expr': expr, 'stmt': stmt, 'bvar': sorted(bvar), 'nfnc': sorted(nfnc)})
+		except CycleError:
+			log.error(f'User \'{ctx.author.name}\' provided self-reffering expressions for \'!b set\'')
+			await ctx.send(f'Found self-referring expressions')
+			return
 
-		func = self.functions[name]
+		func = functions[name]
 		log.debug(f'Succesfully set \'{func["name"]}\' to statement: \'{func["stmt"]}\' using expression: \'{func["expr"]}\'. Collected variables: {", ".join(func["bvar"])} and nested functions: {", ".join(func["nfnc"])}')
 
 	# Display the properties of a bool variable
 	@b.command(brief='Show a boolean statement', description='Show a boolean statement.', usage='x')
 	async def view(self, ctx, target: str):
 		log.debug(f'Recieved \'!b view\' command from user \'{ctx.author.name}\'')
+		functions = self.load_functions(ctx)
 		if target == 'all':
 
 			# Construct message
 			msg = 'Displaying **all** functions\n```'
-			for name, func in self.functions.items():
+			for name, func in functions.items():
 				msg += f'{name} -> {func["expr"]}\n'
 
 			# Display information
 			await ctx.send(msg + '```')
 
 		else:
-			if target not in self.functions:  # Check the existence of provided target
+			if target not in functions:  # Check the existence of provided target
 				log.error(f'User {ctx.author.name} provided a non-existent variable for \'!b view\'')
 				await ctx.send('Non-existent variable provided')
 				return
 
 			# Insert functions if requested
-			func = deepcopy(self.functions[target])
+			func = functions[target]
 			if 'insert' in ctx.message.content.split():
 				try:
-					func = self.insert_funcs(func)
-				except RecursionError:
+					func = self.insert_funcs(functions, target)
+				except CycleError:
 					log.error(f'User \'{ctx.author.name}\' provided self-reffering expressions for \'!b view\'')
 					await ctx.send(f'Found self-referring expressions')
 					return
@@ -146,6 +204,10 @@ class Boolean(commands.Cog, description='Boolean logic module'):
 					log.error(f'User \'{ctx.author.name}\' provided functions containing non-existant nested functions for \'!b view\'')
 					await ctx.send(f'Function contains non-existant nested functions')
 					return
+				except InlineSizeError as err:
+					log.error(f'User \'{ctx.author.name}\' requested an inlined statement that is too long for \'!b view\': {err}')
+					await ctx.send(f'The inserted statement is too long to display')
+					return
 
 			# Display information
 			await ctx.send(f'Displaying information at **{target}**\n``` Expression -> {func["expr"]}\n Statement  ->{func["stmt"]}\n Variables  -> {", ".join(func["bvar"])}\n Functions  -> {", ".join(func["nfnc"])}```')
@@ -156,19 +218,18 @@ class Boolean(commands.Cog, description='Boolean logic module'):
 	@b.command(brief='Display a truth table', description='Display the truth table of any number of expressions.', usage='x y')
 	async def table(self, ctx, *, targets: str):
 		log.debug(f'Recieved \'!b table\' command from user \'{ctx.author.name}\'')
+		functions = self.load_functions(ctx)
 
-		functions = {}
 		superset = []
 		subsets = []
 
-		# Insert functions and find the superset
+		# Collect variables and find the superset
 		for target in targets.split():
-			func = deepcopy(self.functions[target])
 
-			# Insert functions
+			# Collect variables of the target and its nested functions
 			try:
-				func = self.insert_funcs(func)
-			except RecursionError:
+				bvar = functions.variables(target)
+			except CycleError:
 				log.error(f'User \'{ctx.author.name}\' provided self-reffering expressions for \'!b table\'')
 				await ctx.send(f'Found self-referring expressions')
 				return
@@ -178,18 +239,16 @@ class Boolean(commands.Cog, description='Boolean logic module'):
 				return
 
 			# Sort boolean variables into sub and supersets
-			if len(func['bvar']) > len(superset):
+			if len(bvar) > len(superset):
 				subsets.append(superset)
-				superset = func['bvar']
-			elif len(func['bvar']) == len(superset):
-				if func['bvar'] != superset:
+				superset = bvar
+			elif len(bvar) == len(superset):
+				if bvar != superset:
 					log.error(f'User \'{ctx.author.name}\' provided targets containing conflicting variables for \'!b table\'')
 					await ctx.send('Targets contained mismatched variables')
 					return
 			else:
-				subsets.append(func['bvar'])
-
-			functions[target] = func
+				subsets.append(bvar)
 
 		# Check for subset validity
 		for subset in subsets:
@@ -198,39 +257,104 @@ class Boolean(commands.Cog, description='Boolean logic module'):
 				await ctx.send('Targets contained mismatched variables')
 				return
 
-		# Display information
-		msg = f'Displaying truthtable at **{targets}**```{" ".join(superset)} │ {targets}\n{"─"*len(superset)*2}┼{"─"*len(targets)*2}'
-		for perm in product((0, 1), repeat=len(superset)):
-			msg += f'\n{" ".join(list(map(lambda x: str(x), perm)))} │'  # Append permutation to msg
-			for target in targets.split():
-
-				# Insert permutation values into boolean variables
-				func = deepcopy(functions[target])
-				for var in func['bvar']:
-					func['stmt'] = func['stmt'].replace(f' {var} ', f' {perm[superset.index(var)]} ')
+		if len(superset) > max_table_variables:
+			log.error(f'User \'{ctx.author.name}\' requested a truth table with {len(superset)} variables')
+			await ctx.send(f'Your expression has too many variables! I can only display truth tables with {max_table_variables} or less variables')
+			return
 
-				# Append results to msg
-				msg += ' 1' if eval(func['stmt']) else ' 0'
+		# Evaluate every target on all rows at once
+		try:
+			vectors = [functions.vector(target, superset) for target in targets.split()]
+		except ValueError as err:
+			log.error(f'User \'{ctx.author.name}\' provided an unparsable statement for \'!b table\': {err}')
+			await ctx.send('Targets contained an invalid expression')
+			return
 
-		await ctx.send(msg + '```')
+		# Display information, rows are only rendered while they are being sent
+		title = f'Displaying truthtable at **{targets}**'
+		if table_size(superset, targets, len(vectors)) > max_table_messages * 2000:
+			text = io.StringIO()
+			for line in table_lines(superset, targets, vectors):
+				text.write(line + '\n')
+			await ctx.send(title, file=discord.File(io.BytesIO(text.getvalue().encode('utf-8')), filename='truthtable.txt'))
+		else:
+			for chunk in pack(table_lines(superset, targets, vectors), title):
+				await ctx.send(chunk)
 
 		log.debug(f'Successfully displayed table at \'{targets}\'')
 
+	# Display the minimal sum of products of a target expression
+	@b.command(brief='Simplify a boolean statement', description='Display the minimal sum of products of a target expression.', usage='x')
+	async def simplify(self, ctx, target: str):
+		log.debug(f'Recieved \'!b simplify\' command from user \'{ctx.author.name}\'')
+		functions = self.load_functions(ctx)
+
+		# Check for command validity
+		if target not in functions:  # Check the existence of provided name
+			log.error(f'User {ctx.author.name} provided a non-existent variable for \'!b simplify\'')
+			await ctx.send('Non-existent variable provided')
+			return
+
+		# Collect variables of the target and its nested functions
+		try:
+			bvar = functions.variables(target)
+		except CycleError:
+			log.error(f'User \'{ctx.author.name}\' provided self-reffering expressions for \'!b simplify\'')
+			await ctx.send(f'Found self-referring expressions')
+			return
+		except KeyError:
+			log.error(f'User \'{ctx.author.name}\' provided functions containing non-existant nested functions for \'!b simplify\'')
+			await ctx.send(f'Function contains non-existant nested functions')
+			return
+
+		if len(bvar) > max_simplify_variables:
+			log.error(f'User \'{ctx.author.name}\' requested to simplify a function with {len(bvar)} variables')
+			await ctx.send(f'Your expression has too many variables! I can only simplify expressions with {max_simplify_variables} or less variables')
+			return
+
+		# Evaluate and minimize in a worker process so the event loop keeps running
+		definitions = {name: functions[name] for name in functions.order(target)}
+		if self.workers is None:
+			self.workers = ProcessPoolExecutor(max_workers=1)
+		try:
+			async with ctx.typing():
+				job = asyncio.get_running_loop().run_in_executor(self.workers, minimize_function, definitions, target, bvar, simplify_budget)
+				expr, method, exact = await asyncio.wait_for(job, simplify_budget * 2)
+		except ValueError as err:
+			log.error(f'User \'{ctx.author.name}\' provided an unparsable statement for \'!b simplify\': {err}')
+			await ctx.send('Target contained an invalid expression')
+			return
+		except asyncio.TimeoutError:
+			log.error(f'Minimizing \'{target}\' for user \'{ctx.author.name}\' exceeded the time budget')
+			self.stop_workers()  # The worker keeps going after wait_for gives up, later requests would queue behind it
+			await ctx.send('Simplifying took too long, try an expression with less variables')
+			return
+
+		# Display information
+		note = '' if exact else ', stopped early so this may not be minimal'
+		msg = f'Simplified **{target}** using {method}{note}\n```{target} -> {expr}```'
+		if len(msg) > 2000:
+			msg = f'Simplified **{target}** using {method}{note}, but the result has {expr.count("+") + 1} terms and is too long to display'
+		await ctx.send(msg)
+
+		log.debug(f'Successfully simplified \'{target}\' to \'{expr}\'')
+
 	# Display the k-map of target expressions
 	@b.command(brief='Display a k-map', description='Display the k-map of target expressions.', usage='x y')
 	async def kmap(self, ctx, target: str):
 		log.debug(f'Recieved \'!b kmap\' command from user \'{ctx.author.name}\'')
+		functions = self.load_functions(ctx)
 
 		# Check for command validity
-		if target not in self.functions:  # Check the existence of provided name
+		if target not in functions:  # Check the existence of provided name
 			log.error(f'User {ctx.author.name} provided a non-existent variable for \'!b kmap\'')
 			await ctx.send('Non-existent variable provided')
 			return
 
-		# Insert functions
+		# Collect variables of the target and its nested functions
 		try:
-			func = self.insert_funcs(deepcopy(self.functions[target]))
-		except RecursionError:
+			bvar = functions.variables(target)
+		except CycleError:
 			log.error(f'User \'{ctx.author.name}\' provided self-reffering expressions for \'!b kmap\'')
 			await ctx.send(f'Found self-referring expressions')
 			return
@@ -239,25 +363,21 @@ class Boolean(commands.Cog, description='Boolean logic module'):
 			await ctx.send(f'Function contains non-existant nested functions')
 			return
 
+		if len(bvar) > max_map_variables:
+			log.error(f'User \'{ctx.author.name}\' requested a k-map with {len(bvar)} variables')
+			await ctx.send(f'Your expression has too many variables! I can only display k-maps with {max_map_variables} or less variables')
+			return
+
 		# Calculate results
-		out = []
-		for perm in product((0, 1), repeat=len(func['bvar'])):
-			stmt = deepcopy(func['stmt'])
-			for i, var in enumerate(func['bvar']):
-				stmt = stmt.replace(f' {var} ', f' {perm[i]} ')
-			out.append('1' if eval(stmt) else '0')
-
-		if len(out) == 16:
-			await ctx.send(
-			    f'```               {func["bvar"][2]}\n            ───────\n     {out[0]} │ {out[1]} │ {out[3]} │ {out[2]}\n    ───┼───┼───┼───\n     {out[4]} │ {out[5]} │ {out[7]} │ {out[6]}  │\n    ───┼───┼───┼─── │ {func["bvar"][1]}\n  │  {out[12]} │ {out[13]} │ {out[15]} │ {out[14]}  │\n{func["bvar"][0]} │ ───┼───┼───┼───\n  │  {out[8]} │ {out[9]} │ {out[11]} │ {out[10]}\n        ───────\n           {func["bvar"][3]}```'
-			)
-		elif len(out) == 8:
-			await ctx.send(f'```               {func["bvar"][1]}\n            ───────\n     {out[0]} │ {out[1]} │ {out[3]} │ {out[2]}\n    ───┼───┼───┼───\n{func["bvar"][0]} │  {out[4]} │ {out[5]} │ {out[7]} │ {out[6]}\n        ───────\n           {func["bvar"][2]}```')
-		elif len(out) == 4:
-			await ctx.send(f'```         {func["bvar"][1]}\n        ───\n     {out[0]} │ {out[1]}\n    ───┼───\n{func["bvar"][0]} │  {out[2]} │ {out[3]}```')
-		elif len(out) == 2:
-			await ctx.send(f'```     {func["bvar"][0]}\n    ───\n {out[0]} │ {out[1]}```')
-		else:
-			await ctx.send('Your expression has too many variables! I can only display k-maps with 4 or less variables')
+		try:
+			vector = functions.vector(target, bvar)
+		except ValueError as err:
+			log.error(f'User \'{ctx.author.name}\' provided an unparsable statement for \'!b kmap\': {err}')
+			await ctx.send('Target contained an invalid expression')
+			return
+
+		# Display information, 5 and 6 variables come out as stacked maps
+		for chunk in pack(kmap_lines(vector, bvar)):
+			await ctx.send(chunk)
 
 		log.debug(f'Successfully displayed k-map at \'{target}\'')
@@ -1,10 +1,15 @@
+import io
+import json
 import logging
+from os import path
 from os.path import basename
 from random import choice
 
 import discord
 from discord.ext import commands
 
+from utils.logs import segment_path
+
 # -------------------------> Globals
 
 # Setup environment
@@ -48,21 +53,25 @@ class Miscellaneous(commands.Cog, name='Misc', description='Novelty functionalit
 		await ctx.send('Pong!')
 
 	# Dump internal data
-	@commands.command(brief='Dump bot related data', description='Allows the duping of the `log` the `roles` or the local quote database, defaults to quotes', usage='log')
+	@commands.command(brief='Dump bot related data', description='Allows the duping of the `log` (or an older, gzipped segment of it, 1 being the newest backup) the `roles` or the local quote database, defaults to quotes', usage='log (segments back)')
 	@commands.has_permissions(administrator=True)
 	async def dump(self, ctx: commands.Context, *, arg='') -> None:
 		if 'log' in arg:
-			with open('storage/discord.log', 'br') as f:
-				await ctx.send(file=discord.File(f, 'discord.log'))
+			index = int(arg.split()[-1]) if arg.split()[-1].isdigit() else 0  # 0 is the current log, !dump log 2 sends the second newest backup
+			if not path.isfile(segment_path(index)):
+				await ctx.send(f'There is no log segment {index}')
+				return
+			with open(segment_path(index), 'br') as f:  # Segments are rotated at a few MB, so this stays uploadable
+				await ctx.send(file=discord.File(f, path.basename(segment_path(index))))
 				return
 		elif 'roles' in arg:
 			with open('storage/db/roles.json', 'br') as f:
 				await ctx.send(file=discord.File(f, 'roles.json'))
 				return
 		else:
-			with open(f'storage/db/quotes/{ctx.guild.id}.json', 'br') as f:
-				await ctx.send(file=discord.File(f, 'quotes.json'))
-				return
+			quotes = self.bot.get_cog('Quote').load_quotes(str(ctx.guild.id)).export()  # Works for every quote engine and includes unflushed changes
+			await ctx.send(file=discord.File(io.BytesIO(json.dumps(quotes, indent=4).encode('utf-8')), 'quotes.json'))
+			return
 
 	# Delete the last few messages
 	@commands.command(brief='Delete x messages', description='Delete x messages with a max of 95', usage='5')
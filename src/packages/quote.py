@@ -1,19 +1,24 @@
 import json
 import logging
 import re
-from os import path
+from itertools import islice
 from os.path import basename
 from random import choice
-from typing import Dict, List, Tuple, Union
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 import discord
 from discord import Colour
-from discord.ext import commands
+from discord.ext import commands, tasks
+
+from utils.quotestore import Quote, QuoteDatabase, QuoteStore, SQLiteQuoteDatabase, SQLiteQuoteStore
 
 # -------------------------> Globals
 
 # Setup environment
 log = logging.getLogger(__name__)
+colours = [Colour.from_rgb(255,0,0), Colour.orange(), Colour.gold(), Colour.green(), Colour.blue(), Colour.dark_blue(), Colour.purple()]
+blocks_per_page = 6
+max_cached_listings = 32  # Paginated listings kept per guild
 
 # -------------------------> Functions
 
@@ -26,6 +31,116 @@ def setup(bot: commands.Bot) -> None:
 def teardown(bot: commands.Bot) -> None:
 	log.info(f'Extension has been deactivated: {basename(__file__)}')
 
+# Lazily groups quotes into blocks that fit in an embed field, ranked quotes are labeled by rank instead of id
+def quote_blocks(quotes: Iterable[Quote], ranked: bool = False) -> Iterator[Dict[str, Union[int, str]]]:
+	msg, starting_id, previous_id = '', None, None
+	for rank, quote in enumerate(quotes, 1):
+		label = rank if ranked else quote['id']
+		sub_msg = f"{quote['id']}: \"{quote['quote']}\" - {quote['author']}\n"
+		if msg and len(msg) + len(sub_msg) >= 975:
+			yield {"msg": msg, "start": starting_id, "prev": previous_id}
+			msg = ''
+		if not msg:
+			starting_id = label
+		msg, previous_id = msg + sub_msg, label
+	if msg:
+		yield {"msg": msg, "start": starting_id, "prev": previous_id}
+
+# -------------------------> Classes
+
+# Renders quote embeds page by page, only as far as someone has paged
+class QuotePages:
+	def __init__(self, quotes: Iterable[Quote], version: int, ranked: bool = False):
+		self.blocks = quote_blocks(quotes, ranked)
+		self.version = version
+		self.label = 'Results' if ranked else 'Quotes'
+		self.pages: List[discord.Embed] = []
+		self.done = False
+
+	# Total amount of pages, unknown until the last page has been rendered
+	@property
+	def count(self) -> Optional[int]:
+		return len(self.pages) if self.done else None
+
+	# Returns a page, rendering the pages up to it if needed
+	def page(self, index: int) -> Optional[discord.Embed]:
+		while len(self.pages) <= index and not self.done:
+			blocks = list(islice(self.blocks, blocks_per_page))
+			if len(blocks) < blocks_per_page:
+				self.done = True
+			if blocks:
+				embed = discord.Embed(title="Quotes", colour=colours[len(self.pages) % len(colours)])
+				for block in blocks:
+					embed.add_field(name=f"{self.label} {block['start']} : {block['prev']}", value=block['msg'], inline=False)
+				self.pages.append(embed)
+		return self.pages[index] if 0 <= index < len(self.pages) else None
+
+# Asks for a page number to jump to
+class JumpModal(discord.ui.Modal):
+	def __init__(self, view: 'QuoteView'):
+		super().__init__(title='Jump to page')
+		self.view = view
+		self.add_item(discord.ui.InputText(label='Page', placeholder='1', max_length=6))
+
+	async def callback(self, interaction: discord.Interaction):
+		try:
+			index = int(self.children[0].value) - 1
+		except ValueError:
+			return await interaction.response.send_message('That is not a page number', ephemeral=True)
+		await self.view.show(interaction, index)
+
+# Buttons to page through a paginated quote listing
+class QuoteView(discord.ui.View):
+	def __init__(self, cog: 'Quotes', guild_id: str, key: Tuple, source: Callable[[], Iterable[Quote]], ranked: bool):
+		super().__init__(timeout=300)
+		self.cog, self.guild_id, self.key, self.source, self.ranked = cog, guild_id, key, source, ranked
+		self.index = 0
+		self.message: Optional[discord.Message] = None
+
+	# Fetches the pages again so changes made since sending are shown
+	def pages(self) -> QuotePages:
+		return self.cog.paginate(self.guild_id, self.key, self.source, self.ranked)
+
+	# Adds page numbers and toggles buttons for the current page
+	def decorate(self, pages: QuotePages, embed: discord.Embed) -> discord.Embed:
+		last = pages.page(self.index + 1) is None  # Renders at most one page ahead
+		embed.set_footer(text=f"Page {self.index + 1}/{pages.count or '?'} · Powered by {self.cog.bot.user.name}")
+		self.first.disabled = self.previous.disabled = self.index == 0
+		self.next.disabled = last
+		return embed
+
+	async def show(self, interaction: discord.Interaction, index: int):
+		pages = self.pages()
+		embed = pages.page(index)
+		if embed is None:  # Out of range jumps land on the closest page
+			index = max(0, min(index, len(pages.pages) - 1))
+			embed = pages.page(index)
+		if embed is None:
+			return await interaction.response.edit_message(embed=discord.Embed(title="No quotes could be found", color=colours[0]), view=None)
+		self.index = index
+		await interaction.response.edit_message(embed=self.decorate(pages, embed), view=self)
+
+	@discord.ui.button(label='⏮', style=discord.ButtonStyle.grey)
+	async def first(self, button: discord.ui.Button, interaction: discord.Interaction):
+		await self.show(interaction, 0)
+
+	@discord.ui.button(label='◀', style=discord.ButtonStyle.grey)
+	async def previous(self, button: discord.ui.Button, interaction: discord.Interaction):
+		await self.show(interaction, self.index - 1)
+
+	@discord.ui.button(label='▶', style=discord.ButtonStyle.grey)
+	async def next(self, button: discord.ui.Button, interaction: discord.Interaction):
+		await self.show(interaction, self.index + 1)
+
+	@discord.ui.button(label='Jump', style=discord.ButtonStyle.blurple)
+	async def jump(self, button: discord.ui.Button, interaction: discord.Interaction):
+		await interaction.response.send_modal(JumpModal(self))
+
+	# Removes the buttons once nobody is paging anymore
+	async def on_timeout(self):
+		if self.message:
+			await self.message.edit(view=None)
+
 # -------------------------> Cogs
 
 # Quotes cog
@@ -33,23 +148,46 @@ class Quotes(commands.Cog, name='Quote', description='Quote your friends out of
 	def __init__(self, bot: commands.Bot):
 		self.bot = bot
 		self.config = self.load_config()
+		self.db = self.load_database()
+		self.pages: Dict[str, Dict[Tuple, QuotePages]] = {}  # guild -> listing -> rendered pages
+		self.flush_quotes.change_interval(seconds=self.config.get('flush_interval', 30))
+		self.flush_quotes.start()
+
+	# Writes pending changes to disk when the extension stops (this includes bot shutdown)
+	def cog_unload(self):
+		self.flush_quotes.cancel()
+		self.db.flush()
+		if isinstance(self.db, SQLiteQuoteDatabase):
+			self.db.close()
 
 	# Updates config
 	async def update(self):
 		self.config = self.load_config()
+		self.flush_quotes.change_interval(seconds=self.config.get('flush_interval', 30))
 		log.info(f'Quotes ran an update')
 
+	# Periodically writes changed quote databases to disk
+	@tasks.loop(seconds=30)
+	async def flush_quotes(self):
+		if flushed := self.db.flush():
+			log.debug(f'Flushed quote databases of {flushed} guilds')
+
 	# Loads config files
 	def load_config(self):
 		log.debug(f'Loading config/quotes.json...')
 		with open('storage/config/quotes.json', 'r', encoding='utf-8') as file:
 			return json.load(file)
 
-	# Load quote database
-	def load_quotes(self, guild_id: str) -> Dict[str, Dict[str, Union[str, int, List[int] ]]]:
-		log.debug(f'Loading db/quotes/{guild_id}.json...')
-		with open(f'storage/db/quotes/{guild_id}.json', 'r', encoding='utf-8') as file:
-			return json.load(file)
+	# Opens the storage engine selected in config/quotes.json
+	def load_database(self) -> Union[QuoteDatabase, SQLiteQuoteDatabase]:
+		if self.config.get('engine', 'json') == 'sqlite':
+			log.debug(f'Using the SQLite quote engine')
+			return SQLiteQuoteDatabase(self.config.get('sqlite_path', 'storage/db/quotes.sqlite3'))
+		return QuoteDatabase()
+
+	# Get the quote database of a guild
+	def load_quotes(self, guild_id: str) -> Union[QuoteStore, SQLiteQuoteStore]:
+		return self.db[guild_id]
 
 	# Parses string into different groups
 	def split_quote(self, quote: str) -> Tuple[str,str]:
@@ -58,60 +196,47 @@ class Quotes(commands.Cog, name='Quote', description='Quote your friends out of
 		return match.group(1), match.group(2)
 
 	async def quote(self, ctx: commands.Context, args:str) -> None:
-		guild_key = str(ctx.guild.id)
-		quotes = self.load_quotes(guild_key)
+		quotes = self.load_quotes(str(ctx.guild.id))
 
 		try:
 			args = args.split()[1]
-			quote_key = str(int(args))
+			quote_key = int(args)
 			if quote_key not in quotes:
 				raise Exception('key was not present in the dictionary')
 		except:
-			quote_key = choice(list(quotes.keys()))
+			quote_key = choice(list(quotes.ids()))
 
-		quote = quotes[quote_key]
+		quote = quotes.get(quote_key)
 		await ctx.send(f'> {quote_key}: \"{quote["quote"]}\" - {quote["author"]}')
 
-	# Groups quotes into blocks
-	async def mass_quote(self, ctx: commands.Context, quotes: list):
-		quotes, msg = sorted(quotes, key=lambda i: i['id']), ''
-		if len(quotes) == 0:
+	# Returns the cached pages of a listing, every cached listing of a guild is dropped once its quotes change
+	def paginate(self, guild_id: str, key: Tuple, source: Callable[[], Iterable[Quote]], ranked: bool = False) -> QuotePages:
+		version, cache = self.load_quotes(guild_id).version, self.pages.setdefault(guild_id, {})
+		if any(pages.version != version for pages in cache.values()):
+			cache.clear()
+		if key not in cache:
+			if len(cache) >= max_cached_listings:
+				del cache[next(iter(cache))]
+			cache[key] = QuotePages(source(), version, ranked)
+		return cache[key]
+
+	# Sends a listing of quotes as a single paginated embed
+	async def mass_quote(self, ctx: commands.Context, key: Tuple, source: Callable[[], Iterable[Quote]], ranked: bool = False):
+		guild_id = str(ctx.guild.id)
+		pages = self.paginate(guild_id, key, source, ranked)
+		embed = pages.page(0)
+		if embed is None:
 			return await ctx.send(embed = discord.Embed(title="No quotes could be found", description="Try a different search term or submit your own using !q add", color=Colour.from_rgb(255,0,0)))
 
-		starting_id = quotes[0]['id']
-		quoteables = []
-
-		for quote in quotes:
-			sub_msg = f"{quote['id']}: \"{quote['quote']}\" - {quote['author']}\n"
-			if len(msg) + len(sub_msg) >= 975:
-				quoteables.append({"msg": msg, "start": starting_id, "prev": previous_id})
-				msg, starting_id = '', quote['id']
-			msg, previous_id = msg + sub_msg, quote['id']
-
-		quoteables.append({"msg": msg, "start": starting_id, "prev": previous_id})
-		await self.mass_quote_embed(ctx, quoteables)
-
-	# Displays quotes en-mass
-	async def mass_quote_embed(self, ctx: commands.Context, quote_blocks: List[Dict[str, Union[int, str]]]) -> None:
-		colours = [Colour.from_rgb(255,0,0), Colour.orange(), Colour.gold(), Colour.green(), Colour.blue(), Colour.dark_blue(), Colour.purple()]
-		embed = discord.Embed(title="Quotes", colour = colours[0])
-
-		for index, value in enumerate(quote_blocks):
-			if index % 6 == 0 and index != 0:
-				embed.set_footer(text=f"Powered by {self.bot.user.name}")
-				await ctx.send(embed=embed)
-				embed = discord.Embed(title="Quotes", colour = colours[(index // 6) % len(colours)])
-			embed.add_field(name=f"Quotes {value['start']} : {value['prev']}", value=value['msg'], inline=False)
-		embed.set_footer(text=f"Powered by {self.bot.user.name}")
-
-		await ctx.send(embed=embed)
+		view = QuoteView(self, guild_id, key, source, ranked)
+		embed = view.decorate(pages, embed)
+		if pages.count == 1:
+			return await ctx.send(embed=embed)
+		view.message = await ctx.send(embed=embed, view=view)
 
 	# Command group !quote
 	@commands.group(aliases=['quote'], brief='Subgroup for quote functionality', description='Subgroup for quote functionality. Use !help q')
 	async def q(self, ctx: commands.Context) -> None:
-		if not path.isfile('storage/db/quotes/' + str(ctx.guild.id) + '.json'):
-			with open('storage/db/quotes/' + str(ctx.guild.id) + '.json', 'w+', encoding='utf-8') as file:
-				json.dump({}, file, indent=4)
 		if ctx.invoked_subcommand is None:
 			log.info(f'User {ctx.author.name} has passed an invalid quote subcommand: "{ctx.message.content}"')
 			await self.quote(ctx, ctx.message.content)
@@ -127,19 +252,8 @@ class Quotes(commands.Cog, name='Quote', description='Quote your friends out of
 	# Adds a quote to the database
 	@q.command(brief='Add a quote', description='Add a quote to the database', usage='"[quote]" - [author]')
 	async def add(self, ctx: commands.Context, *, args=None) -> None:
-		guild_id = str(ctx.guild.id)
 		quote, author = self.split_quote(args)
-
-		with open(f'storage/db/quotes/{guild_id}.json', 'r+', encoding='utf-8') as file:
-			quotes = json.load(file)
-			if len(quotes) == 0:
-				nextid = 0
-			else:
-				nextid = max(map(lambda x: int(x), quotes.keys())) + 1
-			quotes[str(nextid)] = {'quote': quote, 'author': author, 'remove_votes': [], 'remove_vetos': [], 'id': nextid}
-			file.seek(0)
-			json.dump(quotes, file, indent=4)
-			file.truncate()
+		nextid = self.load_quotes(str(ctx.guild.id)).add(quote, author)
 
 		log.info(f"A quote has been added; {nextid}: \"{quote}\" - {author}")
 		await ctx.send(f'Quote added. Assigned ID: {nextid}')
@@ -148,19 +262,11 @@ class Quotes(commands.Cog, name='Quote', description='Quote your friends out of
 	@q.command(aliases=['del', 'delete'], brief='Remove a quote', description='Remove a quote from the database by id.', usage='[quote id]')
 	@commands.has_permissions(administrator=True)
 	async def remove(self, ctx: commands.Context, *, args=None) -> None:
-		quote_key, guild_id, succes = str(int(args)), str(ctx.guild.id), False
-
-		with open(f'storage/db/quotes/{guild_id}.json', 'r+', encoding='utf-8') as file:
-			quotes = json.load(file)
-			if quote_key in quotes:
-				quote = quotes.pop(quote_key)
-				succes = True
-			file.seek(0)
-			json.dump(quotes, file, indent=4)
-			file.truncate()
-
-		if succes:
-			log.info('Quote {quote} has been removed')
+		quote_key = int(args)
+		quote = self.load_quotes(str(ctx.guild.id)).remove(quote_key)
+
+		if quote:
+			log.info(f'Quote {quote_key} has been removed')
 			await ctx.send(f'Quote removed\n> \"{quote["quote"]}\" - {quote["author"]}')
 		else:
 			log.warning(f'Quote failed to be removed from database due to unknown key: {quote_key}')
@@ -171,70 +277,58 @@ class Quotes(commands.Cog, name='Quote', description='Quote your friends out of
 	@commands.has_permissions(administrator=True)
 	async def edit(self, ctx: commands.Context, *args) -> None:  # the arg parser can do some weird stuff with quotation marks TODO wdym?!?!
 		try:
-			index = str(int(args[0]))  # check for impostor aka strings
+			index = int(args[0])  # check for impostor aka strings
 		except:
 			log.warning(f'Quote edit could not find a quote in the database with key: {args[0]}')  # we are returning from here.
 			await ctx.send(f'Could not find {args[0]} in the database')
 			return
-		request, guild_id = args[1], str(ctx.guild.id)
-
-		with open(f'storage/db/quotes/{guild_id}.json', 'r+', encoding='utf-8') as file:  # starting the file lock
-			quotes = json.load(file)
-			if index not in quotes:  # if the quote is not present we still want to be able to edit this specific index, will screw with the max function in q add
-				quotes[index] = {'quote': '', 'author': '', 'remove_votes': [], 'remove_vetos': [], 'id': int(index)}
-			if request == 'author':
-				quotes[index]['author'] = ' '.join(args[2:])
-			elif request == 'quote':
-				quotes[index]['quote'] = ' '.join(args[2:])
-			else:
-				quote, author = self.split_quote(' '.join(ctx.message.content.split()[3:]))
-				quotes[index]['quote'], quotes[index]['author'] = quote, author
-
-			file.seek(0)
-			json.dump(quotes, file, indent=4)
-			file.truncate()
-		await ctx.send(f'> {index}: \"{quotes[index]["quote"]}\" - {quotes[index]["author"]}')
+		request, quotes = args[1], self.load_quotes(str(ctx.guild.id))
+
+		# If the quote is not present we still want to be able to edit this specific index
+		quote = dict(quotes.get(index) or {'quote': '', 'author': '', 'remove_votes': [], 'remove_vetos': [], 'id': index})
+		if request == 'author':
+			quote['author'] = ' '.join(args[2:])
+		elif request == 'quote':
+			quote['quote'] = ' '.join(args[2:])
+		else:
+			quote['quote'], quote['author'] = self.split_quote(' '.join(ctx.message.content.split()[3:]))
+		quotes.put(index, quote)
+
+		await ctx.send(f'> {index}: \"{quote["quote"]}\" - {quote["author"]}')
 
 	# Searches the quote database
-	@q.command(brief='Search quote database', description='Search the quote database for a specific string.', usage='(quote/author) [query]')
+	@q.command(brief='Search quote database', description='Search the quote database for quotes containing every word of the query, best matches first. Words also match as prefixes, and with the sqlite engine anywhere inside a word.', usage='(quote/author) [query]')
 	async def search(self, ctx: commands.Context, *, args):
-		quotes, search_result = self.load_quotes(str(ctx.guild.id)), []
+		quotes = self.load_quotes(str(ctx.guild.id))
 		search_request = args.split()[0].lower() if args.split()[0].lower() in ['quote', 'author'] else None
 		log.debug(f'Searching with parameters: {args}')
 
 		if search_request:
 			log.debug(f'Searching through {search_request}s')
-			search_key = ' '.join(args.split()[1:]).lower()
-			for quote in quotes:
-				if search_key in quotes[quote][search_request].lower():
-					search_result.append(quotes[quote])
+			search_key = ' '.join(args.split()[1:])
 		else:
 			log.debug('Searching through entire quote object')
-			search_key = args.lower()
-			for quote in quotes:
-				if search_key in quotes[quote]['quote'].lower() + quotes[quote]['author'].lower():
-					search_result.append(quotes[quote])
+			search_key = args
 
-		await self.mass_quote(ctx, search_result)
+		await self.mass_quote(ctx, ('search', search_request, search_key.lower()), lambda: quotes.search(search_key, search_request), ranked=True)
 
 	# Dumps all quotes
 	@q.command(brief='Return all quotes', description='Return all quotes', usage='')
 	async def all(self, ctx: commands.Context) -> None:
 		quotes = self.load_quotes(str(ctx.guild.id))
-		await self.mass_quote(ctx, list(quotes.values()))
+		await self.mass_quote(ctx, ('all',), quotes.sorted_values)
 
 	# Return the last few quotes
 	@q.command(brief='Return the last few quotes', description='Return the last x quotes', usage='(amount)')
 	async def last(self, ctx: commands.Context, arg: int = 10):
 		quotes = self.load_quotes(str(ctx.guild.id))
-		quotes = sorted(list(quotes.values()), key=lambda i: i['id'])
 
 		try:
 			arg = int(arg)
 		except:
 			arg = 10
 
-		await self.mass_quote(ctx, quotes[-arg:])
+		await self.mass_quote(ctx, ('last', arg), lambda: quotes.last(arg))
 
 	# Displays quote statistics
 	@q.command(brief='Quote database statistics', description='Quote database statistics or ask for data on a specific quote', usage='[quote id]')
@@ -242,12 +336,11 @@ class Quotes(commands.Cog, name='Quote', description='Quote your friends out of
 		quotes = self.load_quotes(str(ctx.guild.id))
 
 		if arg == None:
-			await ctx.send(f'Displaying database wide statistics\nAmount of quotes: {len(quotes)}\nEmpty quotes: `{", ".join([str(number) for number in range(0,max(map(lambda x: int(x), quotes.keys()))) if str(number) not in quotes])}`')
+			await ctx.send(f'Displaying database wide statistics\nAmount of quotes: {len(quotes)}\nEmpty quotes: `{", ".join([str(number) for number in range(0, quotes.next_id - 1) if number not in quotes])}`')
 			return
 
 		try:
-			arg = str(int(arg))
-			quote = quotes[arg]
+			quote = quotes.get(int(arg))
 			await ctx.send(f"```Quote: \"{quote['quote']}\"\nAuthor: {quote['author']}\nVotes: {len(quote['remove_votes'])}\nVetos: {len(quote['remove_vetos'])}```")
 		except:
 			await ctx.send('Sorry for the inconvenience, something went wrong.')
@@ -256,49 +349,43 @@ class Quotes(commands.Cog, name='Quote', description='Quote your friends out of
 	# Vote to delete a quote
 	@q.command(brief='Vote to delete a quote', description='Vote to delete a quote', usage='[quote id]')
 	async def vote(self, ctx: commands.Context, quote_id=None) -> None:
-		guild_id, author_id, deleted = str(ctx.guild.id), ctx.author.id, False
+		quotes, author_id, deleted = self.load_quotes(str(ctx.guild.id)), ctx.author.id, False
 
 		try:
-			quote_id = str(int(quote_id))
+			quote_id = int(quote_id)
 		except:
-			log.warning('Vote could not convert arg to an int. Key: {quote_id}')
+			log.warning(f'Vote could not convert arg to an int. Key: {quote_id}')
 			return
 
-		with open(f'storage/db/quotes/{guild_id}.json', 'r+', encoding='utf-8') as file:
-			quotes = json.load(file)
-			if author_id not in quotes[quote_id]['remove_votes']:
-				quotes[quote_id]['remove_votes'].append(author_id)
-				if author_id in quotes[quote_id]['remove_vetos']:
-					quotes[quote_id]['remove_vetos'].remove(author_id)
-			if len(quotes[quote_id]['remove_votes']) - len(quotes[quote_id]['remove_vetos']) >= self.config['needed_votes']:
-				del quotes[quote_id]
-			file.seek(0)
-			json.dump(quotes, file, indent=4)
-			file.truncate()
+		quote = quotes.get(quote_id)
+		if author_id not in quote['remove_votes']:
+			quote['remove_votes'].append(author_id)
+			if author_id in quote['remove_vetos']:
+				quote['remove_vetos'].remove(author_id)
+			quotes.put(quote_id, quote)
+		if len(quote['remove_votes']) - len(quote['remove_vetos']) >= self.config['needed_votes']:
+			deleted = quotes.remove(quote_id) is not None
 
 		await ctx.send('Vote has been registered')  # purely based on the fact that we didn't crash :)
 		if deleted:
-			await ctx.send(f"Quote has been removed\n> {quotes[quote_id]['id']}: \"{quotes[quote_id]['quote']}\" - {quotes[quote_id]['author']}")
+			await ctx.send(f"Quote has been removed\n> {quote['id']}: \"{quote['quote']}\" - {quote['author']}")
 
 	# Veto to delete a quote
 	@q.command(brief='Veto the deletion of a quote', description='Veto the deletion of a quote.', usage='[quote id]')
 	async def veto(self, ctx: commands.Context, quote_id: str = None) -> None:
-		guild_id, author_id = str(ctx.guild.id), ctx.author.id
+		quotes, author_id = self.load_quotes(str(ctx.guild.id)), ctx.author.id
 
 		try:
-			quote_id = str(int(quote_id))
+			quote_id = int(quote_id)
 		except:
-			log.warning('Veto could not convert arg to an int. Key: {quote_id}')
+			log.warning(f'Veto could not convert arg to an int. Key: {quote_id}')
 			return
 
-		with open(f'storage/db/quotes/{guild_id}.json', 'r+', encoding='utf-8') as file:
-			quotes = json.load(file)
-			if author_id not in quotes[quote_id]['remove_vetos']:
-				quotes[quote_id]['remove_vetos'].append(author_id)
-				if author_id in quotes[quote_id]['remove_votes']:
-					quotes[quote_id]['remove_votes'].remove(author_id)
-			file.seek(0)
-			json.dump(quotes, file, indent=4)
-			file.truncate()
+		quote = quotes.get(quote_id)
+		if author_id not in quote['remove_vetos']:
+			quote['remove_vetos'].append(author_id)
+			if author_id in quote['remove_votes']:
+				quote['remove_votes'].remove(author_id)
+			quotes.put(quote_id, quote)
 
 		await ctx.send('Veto has been registered')
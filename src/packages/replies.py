@@ -1,13 +1,17 @@
 import asyncio
+import io
 import json
 import logging
-import re
 from os.path import basename
 from random import choice
 
 import discord
 from discord.ext import commands
 
+from utils.assets import AssetCache
+from utils.cache import TTLCache
+from utils.triggers import TriggerEngine
+
 # -------------------------> Globals
 
 # Setup environment
@@ -31,12 +35,22 @@ class Replies(commands.Cog, description='Module that replies to you in chat'):
 	def __init__(self, bot: commands.Bot):
 		self.bot = bot
 		self.config = self.load_config()
+		self.triggers = self.compile_triggers()
+		self.previous_messages = self.create_message_memory()
 		self.f_flag = True
+		self.assets = AssetCache()
+		self.bot.dispatcher.register('replies', self.on_message, self.triggers)
+
+	def cog_unload(self):
+		self.bot.dispatcher.unregister('replies')
 
 	# Updates config and cog variables
 	async def update(self):
 		self.config = self.load_config()
+		self.triggers = self.compile_triggers()
+		self.previous_messages = self.create_message_memory()
 		self.f_flag = True
+		self.bot.dispatcher.register('replies', self.on_message, self.triggers)
 		log.info(f'Replies ran an update')
 
 	# Loads config files
@@ -45,97 +59,120 @@ class Replies(commands.Cog, description='Module that replies to you in chat'):
 		with open('storage/config/replies.json', 'r', encoding='utf-8') as file:
 			return json.load(file)
 
-	# Detects hatespeach
-	def mod_abuse_detector(self, content: str) -> bool:
-		mod_flag, abuse_flag = False, False
-		for mod in self.config['peace_items'][0]:
-			if mod in content:
-				mod_flag = True
-		for abuse in self.config['peace_items'][1]:
-			if abuse in content:
-				abuse_flag = True
-		return abuse_flag and mod_flag
-
-	# Deletes and reacts to hatespeach
-	async def peace_in_our_time(self, content: str, msg: discord.Message, previousMessages = {}) -> bool:
-		if self.mod_abuse_detector(content):
-			await msg.channel.send(choice(self.config['peace_reactions']))
-			await msg.delete()
+	# Compiles every reply trigger into one matcher, so a message is only scanned once
+	def compile_triggers(self) -> TriggerEngine:
+		return TriggerEngine() \
+			.add('f', ['f'], 'exact') \
+			.add('salute', ['v'], 'exact') \
+			.add('doubt', ['x'], 'exact') \
+			.add('kom_voice', ['kom voice']) \
+			.add('shipit', ['shipit'], 'spaceless') \
+			.add('weed', self.config['weed_items'], 'word') \
+			.add('funny', self.config['funny_items'], 'word') \
+			.add('mod', self.config['peace_items'][0]) \
+			.add('abuse', self.config['peace_items'][1]) \
+			.compile()
+
+	# Remembers the peace categories of the last message of every author per channel for a while, as (categories, message id)
+	def create_message_memory(self) -> TTLCache:
+		return TTLCache(self.config.get('peace_memory_size', 1024), self.config.get('peace_memory_ttl', 300))
+
+	# Detects hatespeach from the peace categories that were hit
+	def mod_abuse_detector(self, categories: frozenset) -> bool:
+		return 'mod' in categories and 'abuse' in categories
+
+	# Deletes and reacts to hatespeach, the previous message of the author counts as well. Decides right away, deletes in the background
+	def peace_in_our_time(self, hits: dict, msg: discord.Message) -> bool:
+		categories = frozenset(('mod', 'abuse')).intersection(hits)
+		if self.mod_abuse_detector(categories):
+			self.defer(msg, self.keep_the_peace(msg))
 			return True
-		previous = previousMessages[msg.author.id] if msg.author.id in previousMessages else None
+		key = (msg.guild.id if msg.guild else None, msg.channel.id, msg.author.id)
+		previous = self.previous_messages.get(key)
 		if previous:
-			if self.mod_abuse_detector(content + ' ' + previous.content.lower()):
-				await msg.channel.send(choice(self.config['peace_reactions']))
-				await msg.delete()
-				await previous.delete()
-				del previousMessages[msg.author.id]
+			previous_categories, previous_id = previous
+			if self.mod_abuse_detector(categories | previous_categories):
+				self.defer(msg, self.keep_the_peace(msg, previous_id))
+				del self.previous_messages[key]
 				return True
-		previousMessages[msg.author.id] = msg
+		self.previous_messages[key] = (categories, msg.id)
 		return False
 
-	# Replies module
-	@commands.Cog.listener()
-	async def on_message(self, msg: discord.Message) -> None:
-		if msg.author.id != self.bot.user.id:
-			content, channel = msg.content.lower(), msg.channel
-
-			# If hatespeach is detected, no replies are to be sent
-			if await self.peace_in_our_time(content, msg):
-				log.info(f'Kept the peace by deleting "{msg.content}"')
-				return
-
-			# Reply with F to pay respects
-			if content == 'f' and self.f_flag:
-				self.f_flag = False
-				await channel.send('F')
-				await asyncio.sleep(15)
-				self.f_flag = True
-				log.info(f'Replied with F to {msg.author.name}f')
-
-			# Rock and stone
-			elif content == 'v':
-				await channel.send(choice(self.config['salute_reactions']))
-				log.info(f'Replied with a salute to {msg.author.name}')
-
-			# Press X to doubt
-			elif content == 'x':
-				with open('storage/static/doubt.png', 'br') as file:
-					await channel.send(file=discord.File(file, 'doubt.png'))
-				log.info(f'Replied with doubt to {msg.author.name}')
-
-			# Invite people to voice
-			elif 'kom voice' in content:
-				with open('storage/static/kom_voice.png', 'br') as file:
-					await channel.send(file=discord.File(file, 'kom_voice.png'))
-				log.info(f'Replied with kom voice to "{msg.content}"')
-
-			# git push -f origin master
-			elif 'shipit' in content.replace(' ', ''):
-				await channel.send('https://cdn.discordapp.com/emojis/727923735239196753.gif?v=1')
-				log.info(f'Replied with shipit to "{msg.content}"')
-
-			# Check for 420
-			try:
-				REGEX = r'(?:^|[\[ -@]|[\[-`]|[{-~]])(' + '|'.join(self.config['weed_items']) + r')(?:$|[\[ -@]|[\[-`]|[{-~]])'  # Just match anything not a letter to be honest
-				if match := re.search(REGEX, content):
-					for emoji in self.config['weed_reactions']:
-						await msg.add_reaction(emoji)
-					log.info(f'Replied with 420 to "{match.group(1)}"')
-			except:
-				pass
-
-			# Check for 69
-			try:
-				REGEX = r'(?:^|[\[ -@]|[\[-`]|[{-~]])(' + '|'.join(self.config['funny_items']) + r')(?:$|[\[ -@]|[\[-`]|[{-~]])'  # Just match anything not a letter to be honest
-				if match := re.search(REGEX, content):
-					for emoji in self.config['funny_reactions']:
-						await msg.add_reaction(emoji)
-					log.info(f'Replied with 69 to "{match.group(1)}"')
-			except:
-				pass
+	async def keep_the_peace(self, msg: discord.Message, previous_id: int = None) -> None:
+		await msg.channel.send(choice(self.config['peace_reactions']))
+		await msg.delete()
+		if previous_id:
+			await msg.channel.get_partial_message(previous_id).delete()
+
+	# Runs a reply in the background, after earlier replies in the same channel
+	def defer(self, msg: discord.Message, coroutine) -> None:
+		self.bot.dispatcher.defer(msg.channel.id, coroutine)
+
+	async def add_reactions(self, msg: discord.Message, emojis: list) -> None:
+		for emoji in emojis:
+			await msg.add_reaction(emoji)
+
+	# Sends a file from storage/static, uploading it only when discord does not host the current version yet
+	async def send_asset(self, channel, name: str) -> None:
+		url = self.assets.url(name)
+		if url:
+			await channel.send(embed=discord.Embed().set_image(url=url))
+			return
+		message = await channel.send(file=discord.File(io.BytesIO(self.assets.get(name).data), name))
+		if message.attachments:
+			self.assets.remember(name, message.attachments[0].url)
+
+	def reset_f_flag(self) -> None:
+		self.f_flag = True
+
+	# Replies module, registered with the message dispatcher
+	async def on_message(self, view) -> None:
+		msg, channel = view.message, view.message.channel
+		hits = view.hits('replies')
+
+		# If hatespeach is detected, no replies are to be sent
+		if self.peace_in_our_time(hits, msg):
+			log.info(f'Kept the peace by deleting "{msg.content}"')
+			return
+
+		# Reply with F to pay respects
+		if 'f' in hits and self.f_flag:
+			self.f_flag = False
+			self.defer(msg, channel.send('F'))
+			asyncio.get_running_loop().call_later(15, self.reset_f_flag)
+			log.info(f'Replied with F to {msg.author.name}f')
+
+		# Rock and stone
+		elif 'salute' in hits:
+			self.defer(msg, channel.send(choice(self.config['salute_reactions'])))
+			log.info(f'Replied with a salute to {msg.author.name}')
+
+		# Press X to doubt
+		elif 'doubt' in hits:
+			self.defer(msg, self.send_asset(channel, 'doubt.png'))
+			log.info(f'Replied with doubt to {msg.author.name}')
+
+		# Invite people to voice
+		elif 'kom_voice' in hits:
+			self.defer(msg, self.send_asset(channel, 'kom_voice.png'))
+			log.info(f'Replied with kom voice to "{msg.content}"')
+
+		# git push -f origin master
+		elif 'shipit' in hits:
+			self.defer(msg, channel.send('https://cdn.discordapp.com/emojis/727923735239196753.gif?v=1'))
+			log.info(f'Replied with shipit to "{msg.content}"')
+
+		# Check for 420
+		if 'weed' in hits:
+			self.defer(msg, self.add_reactions(msg, self.config['weed_reactions']))
+			log.info(f'Replied with 420 to "{hits["weed"][0]}"')
+
+		# Check for 69
+		if 'funny' in hits:
+			self.defer(msg, self.add_reactions(msg, self.config['funny_reactions']))
+			log.info(f'Replied with 69 to "{hits["funny"][0]}"')
 
 	# Command !what
 	@commands.command(brief='What', description='There is nothing about this I understand', usage='')
 	async def what(self, ctx: commands.Context) -> None:
-		with open('storage/static/what.png', 'br') as file:
-			await ctx.send(file=discord.File(file, 'what.png'))
+		await self.send_asset(ctx, 'what.png')
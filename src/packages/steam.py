@@ -1,6 +1,5 @@
 import json
 import logging
-import re
 from os import getenv
 from os.path import basename
 
@@ -9,11 +8,16 @@ from dotenv import load_dotenv
 from steam import steamid
 from steam.webapi import WebAPI
 
+from utils.steamlib import LibraryCache
+
 # -------------------------> Globals
 
 # Setup environment
 load_dotenv()
 log = logging.getLogger(__name__)
+library_ttl = 6 * 60 * 60  # Seconds before a cached library is fetched again
+fetch_concurrency = 16  # Maximum amount of parallel GetOwnedGames calls
+library_path = 'storage/db/steam_libraries.json'
 
 # -------------------------> Functions
 
@@ -26,41 +30,6 @@ def setup(bot: commands.Bot) -> None:
 def teardown(bot: commands.Bot) -> None:
 	log.info(f'Extension has been deactivated: {basename(__file__)}')
 
-# Uses a two-row algorithm to calculate the levenshtein distance between two strings
-def levenshtein(a: str, b: str) -> int:
-    prev = [i for i in range(len(b) + 1)]
-    curr = [0 for _ in range(len(b) + 1)]
-
-    for i in range(len(a)):
-        curr[0] = i + 1
-        for j in range(len(b)):
-            del_cost = prev[j + 1] + 1
-            ins_cost = curr[j] + 1
-            sub_cost = prev[j]
-            if a[i] != b[j]:
-                sub_cost += 1
-
-            curr[j + 1] = min(del_cost, ins_cost, sub_cost)
-
-        for j in range(len(curr)):
-            prev[j] = curr[j]
-
-    return 100 - 100 * prev[len(b)] // max(len(a), len(b))
-
-# Picks a single game from a list of games, using fuzzy matching
-def choose_one(query: dict, collection: list) -> dict:
-    query = query.lower()
-    best_match = None
-    best_ratio = None
-
-    for item in collection:
-        ratio = levenshtein(query, item['alias'].lower())
-        if best_ratio == None or ratio > best_ratio:
-            best_ratio = ratio
-            best_match = item
-
-    return { 'match': best_match, 'ratio': best_ratio }
-
 # -------------------------> Cogs
 
 # Steam cog
@@ -69,6 +38,12 @@ class Steam(commands.Cog, name='Steam', description='Interface with steam'):
         self.bot = bot
         self.users = self.load_config()
         self.steam_api = WebAPI(key=getenv('STEAM_KEY'))
+        self.libraries = LibraryCache(self.fetch_games, library_ttl, fetch_concurrency, library_path)
+        self.linked = self.link_users()
+
+    # Stops the fetch workers
+    def cog_unload(self) -> None:
+        self.libraries.close()
 
     # Updates config
     async def update(self) -> None:
@@ -81,12 +56,35 @@ class Steam(commands.Cog, name='Steam', description='Interface with steam'):
         with open('storage/config/users.json', 'r', encoding='utf-8') as file:
             return json.load(file)
 
+    # Maps steam ids to the discord ids linked to them
+    def link_users(self) -> dict:
+        linked = {}
+        for discord_id, user in self.users.items():
+            linked.setdefault(str(user['steam_id']), set()).add(discord_id)
+        return linked
+
+    # Discord ids of the linked users owning a game, straight from the library cache
+    def owners(self, appid: int) -> set:
+        return {discord_id for steam_id in self.libraries.owners.get(appid, ()) for discord_id in self.linked.get(steam_id, ())}
+
     # Dumps self.users into config
     def dump_config(self):
         log.debug('Dumping data in config/users.json...')
         with open('storage/config/users.json', 'w', encoding='utf-8') as file:
             json.dump(self.users, file, indent=4)
 
+    # Fetches the owned games of a steam id, blocks so it runs in the library cache's thread pool
+    def fetch_games(self, steam_id: str) -> list:
+        return self.steam_api.call(
+            'IPlayerService.GetOwnedGames',
+            steamid=steam_id,
+            include_appinfo=True,
+            include_played_free_games=True,
+            appids_filter=False,
+            include_free_sub=False,
+            skip_unvetted_apps=False
+        )['response'].get('games', [])  # Private profiles have no games field
+
     # Matches userinput to find a game in steamlibrary and pings other users that have that game
     @commands.command(brief='Invite people to play a game', description='Scans Steam inventories for people to play games with', usage='[game]')
     async def letsplay(self, ctx: commands.Context, *, game_name: str) -> None:
@@ -112,60 +110,50 @@ class Steam(commands.Cog, name='Steam', description='Interface with steam'):
                 await ctx.send('That was not a valid url... Please try again or type `go away`')
 
             self.users[str(ctx.author.id)] = { 'steam_id': steam_id }
+            self.linked = self.link_users()
             self.dump_config()
             log.info('User sucessfully added to the SteamID database')
 
         # Fetch caller inventory
-        result = self.steam_api.call(
-            'IPlayerService.GetOwnedGames',
-            steamid=self.users[str(ctx.author.id)]['steam_id'],
-            include_appinfo=True,
-            include_played_free_games=True,
-            appids_filter=False,
-            include_free_sub=False,
-            skip_unvetted_apps=False
-        )['response']['games']
-
-        # Creates aliases of every game to include searches like 'drg' or 'csgo'
-        games = []
-        for game in result:
-            # Create game
-            games.append({
-                'name': game['name'],
-                'appid': game['appid'],
-                'alias': game['name']
-            })
-
-            # Create alias (this isnt suuuuper failproof)
-            games.append({
-                'name': game['name'],
-                'appid': game['appid'],
-                'alias': ''.join([word[0] for word in re.findall(r"[\w]+", game['name'])])
-            })
-
-        # Match input to games
-        target_game = choose_one(game_name, games)
+        try:
+            library = await self.libraries.get(self.users[str(ctx.author.id)]['steam_id'])
+        except Exception as err:
+            log.warning(f'Could not fetch the Steam library of {ctx.author.name}: {err}')
+            await ctx.send('I could not reach Steam, try again later')
+            return
+
+        # Match input to games, including searches like 'drg' or 'csgo'
+        target_game = library.index.choose_one(game_name)
 
         # If no matches found
-        if target_game['ratio'] < 85:
+        if not library.games:
+            await ctx.send('Your Steam library looks empty, is your profile public?')
+        elif target_game['match'] is None:
+            await ctx.send('No such games found in your library!')
+        elif target_game['ratio'] < 85:
             await ctx.send(f'No such games found in your library! Did you mean {target_game["match"]["name"]}?')
 
         # Else ping others
         else:
-            members = [str(member.id) for member in ctx.channel.members]
+            members = {str(member.id) for member in ctx.channel.members}
             message = f'We\'re playing {target_game["match"]["name"]}. Get your ass over here\n'
-            for discord_id, user in self.users.items():
-                games = self.steam_api.call(
-                    'IPlayerService.GetOwnedGames',
-                    steamid=user['steam_id'],
-                    include_appinfo=True,
-                    include_played_free_games=True,
-                    appids_filter=False,
-                    include_free_sub=False,
-                    skip_unvetted_apps=False
-                )['response']['games']
-
-                if target_game['match']['appid'] in [game['appid'] for game in games] and discord_id in members:
-                    message += f'<@!{discord_id}>'
+            await self.libraries.get_many(self.linked)  # Refreshes stale libraries, which keeps the owner index current
+            for discord_id in sorted(self.owners(target_game['match']['appid']) & members):
+                message += f'<@!{discord_id}>'
 
             await ctx.send(message)
+
+    # Lists the linked users owning a game, answered from cached libraries only
+    @commands.command(brief='See who owns a game', description='Lists the people in this server that own a game, using the Steam libraries the bot has seen', usage='[game]')
+    async def whoplays(self, ctx: commands.Context, *, game_name: str) -> None:
+        target_game = self.libraries.catalog.choose_one(game_name)
+        if target_game['match'] is None or target_game['ratio'] < 85:
+            suggestion = f' Did you mean {target_game["match"]["name"]}?' if target_game['match'] else ''
+            await ctx.send(f'Nobody I know owns that game.{suggestion}')
+            return
+
+        members = [member for discord_id in self.owners(target_game['match']['appid']) if (member := ctx.guild.get_member(int(discord_id)))]
+        if not members:
+            await ctx.send(f'Nobody in this server owns {target_game["match"]["name"]}')
+        else:
+            await ctx.send(f'{target_game["match"]["name"]} is owned by: {", ".join(sorted(member.display_name for member in members))}')
@@ -8,6 +8,9 @@ from discord.ext.commands.errors import CheckFailure
 from discord import ExtensionNotFound, ExtensionAlreadyLoaded
 from pretty_help import PrettyHelp
 
+from utils.perf import metrics
+from utils.truthtable import pack
+
 # -------------------------> Globals
 
 log = logging.getLogger(__name__)
@@ -167,3 +170,28 @@ class System(commands.Cog, name='System', description='Internal control function
 
 				else:
 					await ctx.send(f'Extension `{arg}` wasn\'t active!')
+
+	# Groups internal statistics
+	@developerOnly()
+	@commands.group(brief='Internal statistics', description='Internal statistics of the bot', usage='!stats [perf]')
+	async def stats(self, ctx: commands.Context) -> None:
+		if not ctx.invoked_subcommand:
+			await ctx.send('Use `!stats perf` for timings')
+
+	# Sends the slowest commands, listeners, message handlers and API routes, and how late the event loop runs
+	@developerOnly()
+	@stats.command(brief='Latency percentiles', description='Latency percentiles since startup, slowest p99 first. Kinds are command, listener, handler, api and loop', usage='!stats perf (kind) (amount)')
+	async def perf(self, ctx: commands.Context, kind: str = None, amount: int = 15) -> None:
+		if kind == 'all':
+			kind = None
+
+		api = [histogram.count for (entry_kind, _), histogram in metrics.histograms.items() if entry_kind == 'api']
+		lag = metrics.histograms.get(('loop', 'lag'))
+		summary = f'{sum(api)} API calls, loop lag p99 {lag.percentiles()[-1] * 1e3:.1f}ms, worst {lag.worst * 1e3:.1f}ms\n' if lag else f'{sum(api)} API calls\n'
+
+		lines = metrics.report(kind, amount)
+		if len(lines) == 1:
+			await ctx.send(summary + 'Nothing measured yet')
+			return
+		for chunk in pack(lines, summary):
+			await ctx.send(chunk)
@@ -1,15 +1,20 @@
+import asyncio
 import logging
-import threading
 from os.path import basename
+from typing import Dict, Set
 
 import discord
 from discord.ext import commands
 
+from utils.vcroles import Debouncer, RateLimiter, RoleMap, apply, observe, plan
+
 # -------------------------> Globals
 
 log = logging.getLogger(__name__)
-lock = threading.RLock()
 vc_suffix = '-VC'
+debounce = 2.0  # Seconds of voice events that get reconciled together
+calls_per_second = 5  # Pace of role changes per rate limit bucket
+roles_path = 'storage/db/vcroles.json'
 
 # -------------------------> Functions
 
@@ -28,17 +33,63 @@ def teardown(bot: commands.Bot) -> None:
 class VoicePing(commands.Cog):
 	def __init__(self, bot: commands.Bot):
 		self.bot = bot
-
-	# remove all VC roles for which no VC exists.
+		self.locks: Dict[int, asyncio.Lock] = {}  # guild id -> lock around its role changes
+		self.channel_roles = RoleMap(roles_path)  # guild id -> voice channel id -> role id
+		self.synced: Set[int] = set()  # Guilds whose map was checked against their current state
+		self.touched: Dict[int, Set[int]] = {}  # guild id -> members whose voice state changed since the last reconcile
+		self.limiter = RateLimiter(calls_per_second)
+		self.reconciler = Debouncer(self.reconcile, debounce)
+
+	def cog_unload(self):
+		self.reconciler.cancel()
+		self.channel_roles.flush()
+
+	def lock(self, guild: discord.Guild) -> asyncio.Lock:
+		return self.locks.setdefault(guild.id, asyncio.Lock())
+
+	# Channel id -> role id of a guild, checked against the guild once and kept up to date by events afterwards
+	def roles(self, guild: discord.Guild) -> Dict[int, int]:
+		if guild.id not in self.synced:
+			self.sync(guild)
+		return self.channel_roles[guild.id]
+
+	# Drops entries of deleted channels and roles, and adopts roles of channels that have none yet
+	def sync(self, guild: discord.Guild) -> None:
+		channels = {vc.id: vc.name for vc in guild.voice_channels}
+		roles = {role.id: role.name for role in guild.roles}
+		if changed := self.channel_roles.rebuild(guild.id, channels, roles, vc_suffix):
+			log.debug(f'Updated {changed} VC role entries of {guild.name}')
+		self.synced.add(guild.id)
+		self.channel_roles.flush()
+
+	# remove all VC roles for which no VC exists, then reconcile everyone in voice or holding a role. Events keep it clean afterwards
 	async def clean_up(self, guild: discord.Guild) -> None:
-		roles = {role.name: role for role in guild.roles}
-		vc_channels = [vc.name for vc in guild.voice_channels]
-		for role_name in roles:
-			if role_name.replace(vc_suffix,'') not in vc_channels and vc_suffix in role_name:
-				await roles[role_name].delete(reason=f'Role {role_name} out of date and deleted')
-		for role in guild.roles:
-			if len(role.members) == 0 and role.name.endswith(vc_suffix):
-				await role.delete(reason = f'Role {role.name} has no current users and was cleaned up')
+		async with self.lock(guild):
+			mapped = set(self.roles(guild).values())
+			for role in guild.roles:
+				if role.name.endswith(vc_suffix) and role.id not in mapped:
+					await self.limiter.call(('roles', guild.id), lambda: role.delete(reason=f'Role {role.name} out of date and deleted'))
+			touched = self.touched.setdefault(guild.id, set())
+			touched.update(member.id for vc in guild.voice_channels for member in vc.members)
+			touched.update(member.id for role_id in mapped if guild.get_role(role_id) for member in guild.get_role(role_id).members)
+		await self.reconcile(guild.id)
+
+	# Brings the roles of a guild in line with who is in which channel, with as few API calls as possible
+	async def reconcile(self, guild_id: int) -> None:
+		guild = self.bot.get_guild(guild_id)
+		if guild is None:
+			return
+		async with self.lock(guild):
+			mapping, touched = self.roles(guild), self.touched.pop(guild.id, set())
+			occupied, members = observe(guild, mapping, touched)
+			changes = plan(mapping, occupied, members)
+			if changes:
+				try:
+					calls = await apply(changes, guild, mapping, self.limiter, vc_suffix)
+				finally:
+					self.channel_roles.dirty |= bool(changes.create or changes.delete)
+					self.channel_roles.flush()
+				log.debug(f'Reconciled VC roles of {guild.name} for {len(touched)} members: {changes} in {calls} API calls')
 
 	# only vc_channels have a bitrate attribute
 	def is_vc(self, channel: discord.abc.GuildChannel) -> bool:
@@ -48,58 +99,40 @@ class VoicePing(commands.Cog):
 			return False
 		return True
 
-	# returns the role if it exists otherwise, create the role.
-	async def compute_role_if_absent(self, roleName: str, guild: discord.Guild, suffix=None) -> discord.Role:
-		roles = {role.name: role for role in guild.roles}
-		if suffix:
-			roleName = roleName+suffix
-		if roleName in roles:
-			role = roles[roleName]
-			if not role.mentionable:  # clean up unmention-able roles we accidentally created
-				await role.edit(mentionable=True)
-			return roles[roleName]
-		else:
-			return await guild.create_role(name=roleName, mentionable=True, reason="Detected a VC which does not have a role.")
-
-
-	# figure out if joining or leaving.
+	# Catch up on everything that changed while the bot was not running
 	@commands.Cog.listener()
-	async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState) -> None:
-		guild = member.guild
-
-		if after.channel:
-			with lock:
-				role = await self.compute_role_if_absent(after.channel.name, guild, vc_suffix)
-			await member.add_roles(role)
-
-		if before.channel and before.channel != after.channel:
-			with lock:
-				role = await self.compute_role_if_absent(before.channel.name, guild, vc_suffix)
-			await member.remove_roles(role)
-
-		with lock:
+	async def on_ready(self) -> None:
+		self.synced.clear()
+		for guild in self.bot.guilds:
 			await self.clean_up(guild)
 
+	# figure out if joining or leaving, and reconcile every change of the next few seconds at once
+	@commands.Cog.listener()
+	async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState) -> None:
+		if before.channel == after.channel:
+			return
+		self.touched.setdefault(member.guild.id, set()).add(member.id)
+		self.reconciler.mark(member.guild.id)
 
 	# figure out if vc or text, if vc look for a role and update.
 	@commands.Cog.listener()
 	async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel) -> None:
-		guild = after.guild
-		if not self.is_vc(after):
+		if not self.is_vc(after) or before.name == after.name:
 			return
-		roles = {role.name.replace(vc_suffix,''): role for role in guild.roles}
-		for role_name in roles:
-			if role_name == before.name:
-				role = roles[role_name]
-				break
-		with lock:
-			await role.edit(name=(after.name+vc_suffix), reason="Updated VC role in accordance to a channel name change.")
-
-	# delete the role if it exists
+		async with self.lock(after.guild):
+			role = after.guild.get_role(self.roles(after.guild).get(after.id, 0))
+			if role:
+				await role.edit(name=(after.name+vc_suffix), reason="Updated VC role in accordance to a channel name change.")
+
+	# delete the role if it exists, the next reconcile sees the channel is gone
 	@commands.Cog.listener()
 	async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
-		guild = channel.guild
-		if not self.is_vc(channel):
+		if not self.is_vc(channel) or channel.id not in self.channel_roles[channel.guild.id]:
 			return
-		with lock:
-			await self.clean_up(guild)
+		self.reconciler.mark(channel.guild.id)
+
+	# forget roles someone else deleted
+	@commands.Cog.listener()
+	async def on_guild_role_delete(self, role: discord.Role) -> None:
+		if self.channel_roles.forget_role(role.guild.id, role.id):
+			self.channel_roles.flush()
@@ -1,17 +1,27 @@
+import asyncio
+import json
 import logging
-from asyncio import sleep
+from os import listdir
 from os.path import basename
 from random import randint
+from typing import Dict, List, Optional, Tuple
 
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 
+from utils.audio import ClipCache, PlayQueue
+from utils.triggers import TriggerEngine
+
 # -------------------------> Globals
 
 # Setup environment
 log = logging.getLogger(__name__)
 load_dotenv()
+idle_timeout = 120  # Seconds a voice connection stays up after its last clip
+max_queue = 8  # Requests a guild can have waiting, later ones are dropped
+command_priority, trigger_priority = 0, 1  # Asking for a clip goes before clips triggered by chat
+sounds_path = 'storage/static/sounds'
 
 # -------------------------> Functions
 
@@ -24,59 +34,172 @@ def setup(bot: commands.Bot) -> None:
 def teardown(bot: commands.Bot) -> None:
 	log.info(f'Extension has been deactivated: {basename(__file__)}')
 
+# -------------------------> Classes
+
+# Voice connection of one guild, playing queued clips one after another and leaving once idle
+class GuildPlayer:
+	def __init__(self, guild: discord.Guild, clips: ClipCache):
+		self.guild = guild
+		self.clips = clips
+		self.queue = PlayQueue(max_queue)  # (voice channel, clip)
+		self.consumer: Optional[asyncio.Task] = None
+
+	# Queues a clip, returns False if it was dropped as a repeat of the previous request or because the queue is full
+	def enqueue(self, channel: discord.VoiceChannel, clip: str, priority: int = trigger_priority) -> bool:
+		if not self.queue.put((channel, clip), (channel.id, clip), priority):
+			log.debug(f'Dropped {clip} for {channel.name}, {len(self.queue)} clips queued')
+			return False
+		if self.consumer is None or self.consumer.done():
+			self.consumer = asyncio.get_running_loop().create_task(self.consume())
+		return True
+
+	# The only task touching the connection of this guild, so connects and disconnects never race
+	async def consume(self) -> None:
+		try:
+			while True:
+				try:
+					channel, clip = await asyncio.wait_for(self.queue.get(), idle_timeout)
+				except asyncio.TimeoutError:
+					break
+				try:
+					await self.play(channel, clip)
+				except Exception as err:
+					log.error(f'Could not play {clip} in {channel.name}: {err}')
+				finally:
+					self.queue.done()
+		finally:
+			await self.disconnect()
+
+		# Clips queued while disconnecting saw this task still running and did not start another one
+		if len(self.queue):
+			self.consumer = asyncio.get_running_loop().create_task(self.consume())
+
+	# Reuses the connection of the guild, moving it when the clip is meant for another channel
+	async def connect(self, channel: discord.VoiceChannel) -> discord.VoiceClient:
+		client = self.guild.voice_client
+		if client and client.is_connected():
+			if client.channel != channel:
+				await client.move_to(channel)
+			return client
+		if client:
+			await client.disconnect(force=True)
+		return await channel.connect()
+
+	# Plays a clip from its decoded copy and returns once it finished
+	async def play(self, channel: discord.VoiceChannel, clip: str) -> None:
+		loop = asyncio.get_running_loop()
+		await loop.run_in_executor(None, self.clips.load, clip)  # Decodes only the first time
+		client = await self.connect(channel)
+		done = asyncio.Event()
+
+		def after(error: Optional[Exception]) -> None:  # Runs on the audio thread
+			if error:
+				log.error(f'Playback of {clip} failed: {error}')
+			loop.call_soon_threadsafe(done.set)
+
+		client.play(discord.PCMAudio(self.clips.open(clip)), after=after)
+		await done.wait()
+
+	async def disconnect(self) -> None:
+		if self.guild.voice_client:
+			await self.guild.voice_client.disconnect()
+
 # -------------------------> Cogs
 
 # Voice cog
 class Voice(commands.Cog, description='Play music in voice'):
 	def __init__(self, bot):
 		self.bot = bot
+		self.config = self.load_config()
+		self.available = self.index_clips()
+		self.triggers, self.order = self.compile_triggers()
+		self.clips = ClipCache(sounds_path)
+		self.players: Dict[int, GuildPlayer] = {}  # guild id -> player
+		self.bot.dispatcher.register('voice', self.on_message, self.triggers)
 
-	# Plays a sound in voice
-	async def voice_helper(self, vc, file):
-		try:
-			client = await vc.connect()
-		except:
-			if len([client for client in self.bot.voice_clients if client.channel == vc]) != 0:  # very problematic as this could take over a client just when it is about to disconnect, should be synced in reality
-				client = [client for client in self.bot.voice_clients if client.channel == vc][0]
-			else:
-				await [client for client in self.bot.voice_clients if client.guild == vc.guild][0].disconnect()
-				client = await vc.connect()
-
-		client.play(discord.FFmpegPCMAudio(source='storage/static/sounds/' + file))
-		while client.is_playing():
-			await sleep(2)
-		await client.disconnect()
+	# Stops every player and releases the decoded clips
+	def cog_unload(self):
+		self.bot.dispatcher.unregister('voice')
+		for player in self.players.values():
+			if player.guild.voice_client:
+				player.guild.voice_client.stop()  # The audio thread must be done reading before the clips close
+			if player.consumer:
+				player.consumer.cancel()
+		self.clips.close()
+
+	# Updates config and picks up added or removed clips
+	async def update(self):
+		self.config = self.load_config()
+		self.available = self.index_clips()
+		self.triggers, self.order = self.compile_triggers()
+		self.bot.dispatcher.register('voice', self.on_message, self.triggers)
+		log.info(f'Voice ran an update')
+
+	# Loads config files
+	def load_config(self):
+		log.debug('loading data from config/voice.json...')
+		with open('storage/config/voice.json', 'r', encoding='utf-8') as file:
+			return json.load(file)
+
+	# Every clip in the sounds folder, reporting the ones the config refers to but that are missing
+	def index_clips(self) -> frozenset:
+		available = frozenset(file for file in listdir(sounds_path) if file.endswith('.mp3'))
+		wanted = set(self.config.get('builtin_clips', [])) | {trigger['clip'] for trigger in self.config.get('triggers', [])}
+		for clip in sorted(wanted - available):
+			log.warning(f'Voice clip {clip} does not exist in {sounds_path}, its triggers are disabled')
+		return available
+
+	# Compiles the triggers of every available clip into one matcher, returns it with the clips in order of precedence
+	def compile_triggers(self) -> Tuple[TriggerEngine, List[str]]:
+		engine, order = TriggerEngine(), []
+		for trigger in self.config.get('triggers', []):
+			if trigger['clip'] in self.available:
+				engine.add(trigger['clip'], trigger['keywords'], trigger.get('mode', 'substring'))
+				order.append(trigger['clip'])
+		return engine.compile(), order
+
+	# Decodes every clip ahead of the first request
+	@commands.Cog.listener()
+	async def on_ready(self) -> None:
+		loaded = await asyncio.get_running_loop().run_in_executor(None, self.clips.preload, sorted(self.available))
+		log.info(f'Decoded {loaded}/{len(self.available)} voice clips')
+
+	# Plays a sound in voice, after whatever the guild is already playing
+	async def voice_helper(self, vc, file, priority=trigger_priority):
+		if file not in self.available:
+			log.warning(f'Voice clip {file} does not exist in {sounds_path}')
+			return False
+		if vc.guild.id not in self.players:
+			self.players[vc.guild.id] = GuildPlayer(vc.guild, self.clips)
+		return self.players[vc.guild.id].enqueue(vc, file, priority)
 
 	# Plays crabrave in voice
-	async def crabrave(self, text_channel, vc, arg=None):
+	async def crabrave(self, text_channel, vc, arg=None, priority=trigger_priority):
 		path = 'crab_rave.mp3' if randint(0, 20) != 0 else 'under_rave.mp3'
 		await text_channel.send(f"{arg} IS GONE :crab: :crab: :crab: :crab: :crab: :crab: :crab:")  # crab rave gif / shortened version of crab rave
 		await text_channel.send('https://tenor.com/view/crab-safe-dance-gif-13211112')
-		await self.voice_helper(vc, path)
+		await self.voice_helper(vc, path, priority)
 
-	# Plays sounds in voice depending on messages
-	@commands.Cog.listener()
-	async def on_message(self, msg):
-		if msg.author.id == self.bot.user.id:
+	# Plays sounds in voice depending on messages, the first trigger in config order wins. Registered with the message dispatcher
+	async def on_message(self, view):
+		msg = view.message
+		if not getattr(msg.author, 'voice', None):
+			return
+		if view.lower.endswith('is gone'):
+			self.bot.dispatcher.defer(msg.channel.id, self.crabrave(msg.channel, msg.author.voice.channel, msg.content.upper()[:-7]))
 			return
-		content = msg.content.lower()
-		if content.endswith('is gone'):
-			await self.crabrave(msg.channel, msg.author.voice.channel, msg.content.upper()[:-7])
-		elif 'play despacito' in content:
-			await self.voice_helper(msg.author.voice.channel, 'despacito.mp3')
-		elif 'play zoutelande' in content or 'speel zoutelande' in content:
-			await self.voice_helper(msg.author.voice.channel, 'zoutelande.mp3')
-		elif 'tequila' in content:
-			await self.voice_helper(msg.author.voice.channel, 'tequila.mp3')
-		elif 'sigma' in content:
-			await self.voice_helper(msg.author.voice.channel, 'sigma.mp3')
+		hits = view.hits('voice')
+		for clip in self.order:
+			if clip in hits:
+				await self.voice_helper(msg.author.voice.channel, clip)
+				break
 
 	# Plays crabrave in voice
 	@commands.command(brief='Stuff is gone', description='Stuff is gone.', usage='my social life')
 	async def gone(self, ctx, arg: str = ''):
-		await self.crabrave(ctx, ctx.author.voice.channel, arg)
+		await self.crabrave(ctx, ctx.author.voice.channel, arg, command_priority)
 
 	# Plays coffin dance in voice
 	@commands.command(brief='He dead', description='He dead.', usage='')
 	async def dead(self, ctx):
-		await self.voice_helper(ctx.author.voice.channel, 'astronomia.mp3')  # coffin dance gif / shortened song
+		await self.voice_helper(ctx.author.voice.channel, 'astronomia.mp3', command_priority)  # coffin dance gif / shortened song
@@ -0,0 +1,48 @@
+import os
+import time
+from os import path
+from typing import Callable, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+# -------------------------> Classes
+
+# Contents of one static file and where discord already hosts it
+class Asset:
+	def __init__(self, data: bytes, mtime: float):
+		self.data = data
+		self.mtime = mtime
+		self.url: Optional[str] = None
+		self.expires = 0.0
+
+# Static files read once and remembered by their CDN url after the first upload, both forgotten when the file changes
+class AssetCache:
+	def __init__(self, directory: str = 'storage/static', url_ttl: float = 12 * 60 * 60, timer: Callable[[], float] = time.time):
+		self.directory = directory
+		self.url_ttl = url_ttl  # Longest a CDN url is trusted, attachment urls are signed and expire
+		self.timer = timer
+		self.assets: Dict[str, Asset] = {}
+
+	def get(self, name: str) -> Asset:
+		file_path = path.join(self.directory, name)
+		mtime = os.stat(file_path).st_mtime
+		asset = self.assets.get(name)
+		if asset is None or asset.mtime != mtime:
+			with open(file_path, 'rb') as file:
+				asset = self.assets[name] = Asset(file.read(), mtime)
+		return asset
+
+	# CDN url of the current version of a file, None if it has to be uploaded (again)
+	def url(self, name: str) -> Optional[str]:
+		asset = self.get(name)
+		return asset.url if asset.url and asset.expires > self.timer() else None
+
+	# Remembers where an upload of a file ended up, until the signature in the url runs out
+	def remember(self, name: str, url: str) -> None:
+		asset, expires = self.get(name), self.timer() + self.url_ttl
+		signed = parse_qs(urlparse(url).query).get('ex')
+		if signed:
+			try:
+				expires = min(expires, int(signed[0], 16) - 60)  # Hex unix time, with a minute to spare
+			except ValueError:
+				pass
+		asset.url, asset.expires = url, expires
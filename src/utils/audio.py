@@ -0,0 +1,127 @@
+import asyncio
+import itertools
+import logging
+import mmap
+import os
+import subprocess
+import tempfile
+from collections import Counter
+from os import path
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+# -------------------------> Globals
+
+# Setup environment
+log = logging.getLogger(__name__)
+frame_size = 3840  # Bytes discord reads per 20ms frame: 48kHz, 16 bit, stereo
+
+# -------------------------> Classes
+
+# File-like reader over decoded PCM, every play gets its own position in the shared mapping
+class MappedPCM:
+	def __init__(self, buffer: mmap.mmap):
+		self.buffer = buffer
+		self.position = 0
+
+	def read(self, size: int = frame_size) -> bytes:
+		chunk = self.buffer[self.position:self.position + size]
+		self.position += len(chunk)
+		return chunk
+
+# Bounded priority queue of playback requests that ignores a request identical to the one just before it
+class PlayQueue:
+	def __init__(self, maxsize: int = 8):
+		self.maxsize = maxsize
+		self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue()  # (priority, order, key, item), lowest priority first
+		self.order = itertools.count()  # Keeps requests of equal priority first come, first served
+		self.last: Optional[Hashable] = None  # Key of the latest accepted request
+		self.queued: Counter = Counter()  # key -> requests waiting
+		self.playing: Optional[Hashable] = None
+
+	def __len__(self) -> int:
+		return self.queue.qsize()
+
+	# Queues an item, returns False when it was dropped as a duplicate or because the queue is full
+	def put(self, item: Any, key: Hashable, priority: int = 0) -> bool:
+		if key == self.last and (self.playing == key or self.queued[key]):
+			return False
+		if len(self) >= self.maxsize:
+			return False
+		self.queue.put_nowait((priority, next(self.order), key, item))
+		self.queued[key] += 1
+		self.last = key
+		return True
+
+	async def get(self) -> Any:
+		_, _, self.playing, item = await self.queue.get()
+		self.queued[self.playing] -= 1
+		return item
+
+	# Marks the item from the last get as finished
+	def done(self) -> None:
+		self.playing = None
+
+# Decodes every clip to raw PCM once, keeps the result on disk and memory-maps it for playback
+class ClipCache:
+	def __init__(self, source_dir: str = 'storage/static/sounds', cache_dir: str = 'storage/cache/sounds', ffmpeg: str = 'ffmpeg'):
+		self.source_dir = source_dir
+		self.cache_dir = cache_dir
+		self.ffmpeg = ffmpeg
+		self.maps: Dict[str, Tuple[float, mmap.mmap]] = {}  # clip -> (source mtime, mapping)
+
+	def source_path(self, clip: str) -> str:
+		return path.join(self.source_dir, clip)
+
+	def pcm_path(self, clip: str) -> str:
+		return path.join(self.cache_dir, f'{clip}.pcm')
+
+	# Runs ffmpeg unless an up to date decoded copy exists, returns the path of that copy
+	def decode(self, clip: str) -> str:
+		source, target = self.source_path(clip), self.pcm_path(clip)
+		if path.isfile(target) and path.getmtime(target) >= path.getmtime(source):
+			return target
+		os.makedirs(self.cache_dir, exist_ok=True)
+		fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix=f'.{clip}.', suffix='.tmp')
+		os.close(fd)
+		try:
+			subprocess.run([self.ffmpeg, '-v', 'error', '-y', '-i', source, '-f', 's16le', '-ar', '48000', '-ac', '2', tmp], check=True, capture_output=True)
+			os.replace(tmp, target)
+		except BaseException:
+			if path.exists(tmp):
+				os.remove(tmp)
+			raise
+		log.debug(f'Decoded {clip} to {target}')
+		return target
+
+	# Mapping of a decoded clip, decoded again when the source file changed. Blocking, run it in an executor
+	def load(self, clip: str) -> mmap.mmap:
+		mtime = path.getmtime(self.source_path(clip))
+		cached = self.maps.get(clip)
+		if cached and cached[0] == mtime:
+			return cached[1]
+		with open(self.decode(clip), 'rb') as file:
+			if not path.getsize(file.name):
+				raise ValueError(f'{clip} decoded to nothing')
+			buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+		self.maps[clip] = (mtime, buffer)  # The previous mapping stays valid for plays still reading it
+		return buffer
+
+	# Loads many clips, logging the ones that fail instead of stopping
+	def preload(self, clips: Iterable[str]) -> int:
+		loaded = 0
+		for clip in clips:
+			try:
+				self.load(clip)
+				loaded += 1
+			except (OSError, ValueError, subprocess.CalledProcessError) as err:
+				log.error(f'Could not decode {clip}: {err}')
+		return loaded
+
+	# A fresh reader for a clip that is already loaded
+	def open(self, clip: str) -> MappedPCM:
+		return MappedPCM(self.maps[clip][1])
+
+	def close(self) -> None:
+		for _, buffer in self.maps.values():
+			buffer.close()
+		self.maps.clear()
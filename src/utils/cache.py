@@ -0,0 +1,83 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Iterator, Optional, Tuple, TypeVar
+
+# -------------------------> Globals
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+# -------------------------> Classes
+
+# Mapping with a maximum size (least recently used entries go first) and optional expiry of entries
+class TTLCache(Generic[K, V]):
+	def __init__(self, maxsize: int, ttl: Optional[float] = None, timer: Callable[[], float] = time.monotonic, on_evict: Optional[Callable[[K, V], None]] = None, sliding: bool = False):
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self.timer = timer
+		self.on_evict = on_evict  # Called with every entry dropped for its age or to make room, not for explicit removals
+		self.sliding = sliding  # Restart the ttl of an entry on every get, so only idle entries expire
+		self.data: 'OrderedDict[K, Tuple[float, V]]' = OrderedDict()  # key -> (expiry, value), least recently used first
+
+	def __len__(self) -> int:
+		return len(self.data)
+
+	def __iter__(self) -> Iterator[K]:
+		return iter(list(self.data))
+
+	def __contains__(self, key: K) -> bool:
+		return self.get(key) is not None
+
+	def __getitem__(self, key: K) -> V:
+		value = self.get(key)
+		if value is None:
+			raise KeyError(key)
+		return value
+
+	def __setitem__(self, key: K, value: V) -> None:
+		self.data[key] = (self.timer() + self.ttl if self.ttl is not None else float('inf'), value)
+		self.data.move_to_end(key)
+		self.expire()
+		while len(self.data) > self.maxsize:
+			self.evict(*self.data.popitem(last=False))
+
+	def __delitem__(self, key: K) -> None:
+		del self.data[key]
+
+	# Returns a live entry and marks it as recently used
+	def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+		entry = self.data.get(key)
+		if entry is None:
+			return default
+		now = self.timer()
+		if entry[0] <= now:
+			del self.data[key]
+			self.evict(key, entry)
+			return default
+		if self.sliding and self.ttl is not None:
+			self.data[key] = (now + self.ttl, entry[1])
+		self.data.move_to_end(key)
+		return entry[1]
+
+	def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+		entry = self.data.pop(key, None)
+		if entry is None or entry[0] <= self.timer():
+			return default
+		return entry[1]
+
+	# Drops expired entries from the least recently used end
+	def expire(self) -> None:
+		now = self.timer()
+		while self.data:
+			key, entry = next(iter(self.data.items()))
+			if entry[0] > now:
+				break
+			del self.data[key]
+			self.evict(key, entry)
+
+	def evict(self, key: K, entry: Tuple[float, V]) -> None:
+		if self.on_evict:
+			self.on_evict(key, entry[1])
+
+	def clear(self) -> None:
+		self.data.clear()
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import re
+from functools import cached_property
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from utils.perf import metrics
+from utils.triggers import TriggerEngine
+
+# -------------------------> Globals
+
+# Setup environment
+log = logging.getLogger(__name__)
+
+# -------------------------> Classes
+
+# Normalized forms of one message, each computed the first time a handler asks and shared by all of them
+class MessageView:
+	def __init__(self, message, engine: TriggerEngine):
+		self.message = message
+		self.engine = engine
+
+	@cached_property
+	def lower(self) -> str:
+		return self.message.content.lower()
+
+	@cached_property
+	def spaceless(self) -> str:
+		return self.lower.replace(' ', '')
+
+	@cached_property
+	def words(self) -> List[str]:
+		return re.findall(r'\w+', self.lower)
+
+	# Every trigger of every handler hit by this message, as handler -> category -> keywords, from a single scan
+	@cached_property
+	def all_hits(self) -> Dict[str, Dict[str, List[str]]]:
+		grouped: Dict[str, Dict[str, List[str]]] = {}
+		for key, keywords in self.engine.scan(self.lower, self.spaceless if self.engine.spaceless_pattern else None).items():
+			name, category = key.split(':', 1)
+			grouped.setdefault(name, {})[category] = keywords
+		return grouped
+
+	def hits(self, name: str) -> Dict[str, List[str]]:
+		return self.all_hits.get(name, {})
+
+Handler = Callable[[MessageView], Awaitable[None]]
+
+# Hands every message to the registered handlers, their triggers merged into one matcher so a message is scanned once
+class Dispatcher:
+	def __init__(self):
+		self.handlers: Dict[str, Handler] = {}  # name -> handler, called in registration order
+		self.engines: Dict[str, TriggerEngine] = {}  # name -> triggers of that handler
+		self.engine = TriggerEngine().compile()
+		self.tails: Dict[int, asyncio.Task] = {}  # channel id -> last deferred side effect in that channel
+
+	# Registers a handler under a name, replacing an earlier one with that name
+	def register(self, name: str, handler: Handler, engine: Optional[TriggerEngine] = None) -> None:
+		if ':' in name:
+			raise ValueError(f'Handler names can not contain a colon: {name}')
+		self.handlers.pop(name, None)
+		self.handlers[name] = handler
+		self.engines[name] = engine or TriggerEngine()
+		self.merge()
+
+	def unregister(self, name: str) -> None:
+		self.handlers.pop(name, None)
+		if self.engines.pop(name, None):
+			self.merge()
+
+	def merge(self) -> None:
+		merged = TriggerEngine()
+		for name, engine in self.engines.items():
+			for category, keyword, mode in engine.triggers:
+				merged.add(f'{name}:{category}', [keyword], mode)
+		self.engine = merged.compile()
+
+	async def dispatch(self, message) -> None:
+		view = MessageView(message, self.engine)
+		for name, handler in list(self.handlers.items()):
+			try:
+				with metrics.time('handler', name):
+					await handler(view)
+			except Exception as err:
+				log.exception(f'Message handler {name} failed: {err}')
+
+	# Runs a slow side effect in the background, after every side effect deferred earlier in the same channel
+	def defer(self, channel_id: int, coroutine: Awaitable) -> asyncio.Task:
+		task = asyncio.get_running_loop().create_task(self.run_after(self.tails.get(channel_id), coroutine))
+		self.tails[channel_id] = task
+		task.add_done_callback(lambda done: self.tails.pop(channel_id) if self.tails.get(channel_id) is done else None)
+		return task
+
+	async def run_after(self, previous: Optional[asyncio.Task], coroutine: Awaitable) -> None:
+		if previous:
+			await asyncio.wait({previous})  # Only for the order, its failure is not ours
+		try:
+			await coroutine
+		except Exception as err:
+			log.exception(f'Deferred message side effect failed: {err}')
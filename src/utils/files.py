@@ -0,0 +1,24 @@
+import json
+import os
+import tempfile
+from os import path
+
+# -------------------------> Functions
+
+# Writes to a temp file next to target and renames it over target, so a crash can never leave a truncated file
+def atomic_write(target: str, text: str) -> None:
+	fd, tmp = tempfile.mkstemp(dir=path.dirname(target) or '.', prefix=f'.{path.basename(target)}.', suffix='.tmp')
+	try:
+		with os.fdopen(fd, 'w', encoding='utf-8') as file:
+			file.write(text)
+			file.flush()
+			os.fsync(file.fileno())
+		os.replace(tmp, target)
+	except BaseException:
+		if path.exists(tmp):
+			os.remove(tmp)
+		raise
+
+# Writes json atomically, see atomic_write
+def atomic_dump(target: str, data, indent: int = 4) -> None:
+	atomic_write(target, json.dumps(data, indent=indent))
@@ -0,0 +1,99 @@
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# -------------------------> Globals
+
+shortlist_size = 40  # Candidates that get an exact edit distance
+
+# -------------------------> Functions
+
+# Lowercases a game name and drops trademark clutter
+def normalize(name: str) -> str:
+	return ' '.join(re.sub(r'[™®©]', '', name).lower().split())
+
+# First letter of every word, to include searches like 'drg' or 'csgo' (this isnt suuuuper failproof)
+def acronym(name: str) -> str:
+	return ''.join(word[0] for word in re.findall(r'\w+', name.lower()))
+
+# Trigrams of a padded string, so short strings and word edges still produce some
+def trigrams(text: str) -> List[str]:
+	text = f'  {text} '
+	return [text[i:i + 3] for i in range(len(text) - 2)]
+
+# Edit distance of a and b, gives up with limit + 1 as soon as it is certain to exceed limit
+def bounded_levenshtein(a: str, b: str, limit: int) -> int:
+	if abs(len(a) - len(b)) > limit:
+		return limit + 1
+	if len(a) < len(b):
+		a, b = b, a
+	prev = list(range(len(b) + 1))
+	for i, char in enumerate(a, 1):
+		curr = [i]
+		best = i
+		for j, other in enumerate(b, 1):
+			cost = prev[j - 1] if char == other else prev[j - 1] + 1
+			if prev[j] + 1 < cost:
+				cost = prev[j] + 1
+			if curr[j - 1] + 1 < cost:
+				cost = curr[j - 1] + 1
+			curr.append(cost)
+			if cost < best:
+				best = cost
+		if best > limit:  # Every path runs through this row
+			return limit + 1
+		prev = curr
+	return prev[-1]
+
+# Similarity in percent, 100 means equal
+def ratio(distance: int, a: str, b: str) -> int:
+	return 100 - 100 * distance // max(len(a), len(b), 1)
+
+# Largest distance that still gives a ratio above best_ratio
+def distance_limit(best_ratio: int, a: str, b: str) -> int:
+	return ((100 - best_ratio) * max(len(a), len(b), 1) - 1) // 100
+
+# -------------------------> Classes
+
+# Fuzzy search over the games of one library, built once per fetched library
+class GameIndex:
+	def __init__(self, games: Dict[int, str]):
+		self.aliases: List[Tuple[str, int, str]] = []  # (alias, appid, name)
+		for appid, name in games.items():
+			self.aliases.append((normalize(name), appid, name))
+			self.aliases.append((acronym(name), appid, name))
+		self.exact: Dict[str, int] = {}  # alias -> first alias index
+		self.postings: Dict[str, List[int]] = {}  # trigram -> alias indices
+		for index, (alias, _, _) in enumerate(self.aliases):
+			self.exact.setdefault(alias, index)
+			for trigram in set(trigrams(alias)):
+				self.postings.setdefault(trigram, []).append(index)
+
+	# Returns the aliases sharing the most trigrams with query
+	def shortlist(self, query: str) -> List[int]:
+		shared: Counter = Counter()
+		for trigram in set(trigrams(query)):
+			shared.update(self.postings.get(trigram, ()))
+		return [index for index, _ in shared.most_common(shortlist_size)]
+
+	# Picks the best matching game, as {'match': {'name', 'appid', 'alias'}, 'ratio'}
+	def choose_one(self, query: str) -> Dict[str, Optional[object]]:
+		query = normalize(query)
+		if query in self.exact:
+			candidates, best_index, best_ratio = [], self.exact[query], 100
+		else:
+			candidates, best_index, best_ratio = self.shortlist(query), None, -1
+
+		for index in candidates:
+			alias = self.aliases[index][0]
+			limit = distance_limit(best_ratio, query, alias)
+			if limit < 0:
+				continue
+			distance = bounded_levenshtein(query, alias, limit)
+			if distance <= limit:
+				best_index, best_ratio = index, ratio(distance, query, alias)
+
+		if best_index is None:
+			return {'match': None, 'ratio': None}
+		alias, appid, name = self.aliases[best_index]
+		return {'match': {'name': name, 'appid': appid, 'alias': alias}, 'ratio': best_ratio}
@@ -0,0 +1,216 @@
+import ast
+from typing import Dict, List, Sequence, Set
+
+# -------------------------> Globals
+
+operators = {ast.And: lambda a, b: a & b, ast.Or: lambda a, b: a | b}
+max_inline_size = 100_000  # Longest inlined statement built, chains like $x ^ $x double in size per level
+
+# -------------------------> Functions
+
+# Parses a statement built by !b set into an expression tree, rejecting anything that is not boolean logic
+def compile_statement(stmt: str) -> ast.expr:
+	try:
+		tree = ast.parse(stmt.strip(), mode='eval').body
+	except SyntaxError as err:
+		raise ValueError(f'Malformed statement: {stmt.strip()}') from err
+	for node in ast.walk(tree):
+		if not isinstance(node, (ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.BinOp, ast.BitXor, ast.Name, ast.Load, ast.Constant)):
+			raise ValueError(f'Statement contains an unsupported {type(node).__name__}')
+		if isinstance(node, ast.UnaryOp) and not isinstance(node.op, ast.Not) or isinstance(node, ast.BinOp) and not isinstance(node.op, ast.BitXor):
+			raise ValueError(f'Statement contains an unsupported operator')
+		if isinstance(node, ast.Constant) and node.value not in (0, 1):
+			raise ValueError(f'Statement contains a non-boolean constant: {node.value}')
+	return tree
+
+# Bitmask of every variable over all 2**n rows, rows ordered like itertools.product((0, 1), repeat=n)
+def columns(variables: Sequence[str]) -> Dict[str, int]:
+	rows = 1 << len(variables)
+	masks = {}
+	for i, var in enumerate(variables):
+		block = 1 << (len(variables) - 1 - i)  # Rows per run of equal values
+		unit = ((1 << block) - 1) << block  # One run of zeroes followed by one run of ones
+		masks[var] = unit * (((1 << rows) - 1) // ((1 << 2 * block) - 1))  # Repeat that pattern over every row
+	return masks
+
+# Evaluates an expression tree on every row at once, bit r of the result is the value on row r
+def evaluate(node: ast.expr, masks: Dict[str, int], full: int) -> int:
+	if isinstance(node, ast.Name):
+		if node.id not in masks:
+			raise KeyError(node.id)
+		return masks[node.id]
+	if isinstance(node, ast.Constant):
+		return full if node.value else 0
+	if isinstance(node, ast.UnaryOp):
+		return full ^ evaluate(node.operand, masks, full)
+	if isinstance(node, ast.BinOp):
+		return evaluate(node.left, masks, full) ^ evaluate(node.right, masks, full)
+	result = evaluate(node.values[0], masks, full)
+	for value in node.values[1:]:
+		result = operators[type(node.op)](result, evaluate(value, masks, full))
+	return result
+
+# Truth vector of a statement over the given variables
+def truth_vector(tree: ast.expr, variables: Sequence[str]) -> int:
+	return evaluate(tree, columns(variables), (1 << (1 << len(variables))) - 1)
+
+# Reads the value of every row out of a truth vector
+def rows(vector: int, variables: int) -> List[int]:
+	return [vector >> row & 1 for row in range(1 << variables)]
+
+# -------------------------> Classes
+
+# Raised when functions refer to themselves, directly or through others
+class CycleError(Exception):
+	pass
+
+# Raised when the inlined statement of a function would be longer than allowed
+class InlineSizeError(Exception):
+	pass
+
+# Boolean functions with their references, caches every function's inlined form until something it depends on changes
+class FunctionGraph:
+	def __init__(self):
+		self.functions: Dict[str, dict] = {}  # name -> definition as stored by !b set
+		self.dependents: Dict[str, Set[str]] = {}  # name -> functions referring to it directly
+		self.compiled: Dict[str, ast.expr] = {}  # name -> own statement, references left as _name
+		self.inlined: Dict[str, str] = {}  # name -> statement with every reference resolved, only kept in memory
+		self.dirty = False  # Set on every change to the definitions
+
+	def __contains__(self, name: str) -> bool:
+		return name in self.functions
+
+	def __getitem__(self, name: str) -> dict:
+		return self.functions[name]
+
+	def __len__(self) -> int:
+		return len(self.functions)
+
+	def items(self):
+		return self.functions.items()
+
+	# Definitions in their on-disk json layout, inlined forms are rebuilt when needed
+	def to_json(self) -> dict:
+		return {'functions': self.functions}
+
+	# Restores a graph, ignoring the inlined forms older versions stored
+	@classmethod
+	def from_json(cls, data: dict) -> 'FunctionGraph':
+		graph = cls()
+		graph.functions = data.get('functions', {})
+		for name in graph.functions:
+			graph.link(name)
+		return graph
+
+	# Stores a definition, refusing it if it would make functions refer to themselves
+	def set(self, func: dict) -> None:
+		name = func['name']
+		previous = self.functions.get(name)
+		self.unlink(name)
+		self.functions[name] = func
+		self.link(name)
+		try:
+			self.order(name, missing_ok=True)
+		except CycleError:
+			self.unlink(name)
+			if previous is None:
+				del self.functions[name]
+			else:
+				self.functions[name] = previous
+				self.link(name)
+			raise
+		self.dirty = True
+
+	def clear(self) -> None:
+		self.functions, self.dependents, self.compiled, self.inlined = {}, {}, {}, {}
+		self.dirty = True
+
+	def link(self, name: str) -> None:
+		for target in self.functions[name]['nfnc']:
+			self.dependents.setdefault(target, set()).add(name)
+		self.invalidate(name)
+
+	def unlink(self, name: str) -> None:
+		if name not in self.functions:
+			return
+		for target in self.functions[name]['nfnc']:
+			self.dependents.get(target, set()).discard(name)
+		self.compiled.pop(name, None)
+		self.invalidate(name)
+
+	# Drops the inlined forms of a function and of everything depending on it
+	def invalidate(self, name: str) -> None:
+		stack, seen = [name], {name}
+		while stack:
+			current = stack.pop()
+			self.inlined.pop(current, None)
+			for dependent in self.dependents.get(current, ()):
+				if dependent not in seen:
+					seen.add(dependent)
+					stack.append(dependent)
+
+	# Returns name and everything it refers to, every function after the ones it refers to
+	def order(self, name: str, missing_ok: bool = False) -> List[str]:
+		order, state = [], {}  # state: 1 while on the current path, 2 once finished
+		stack = [(name, iter(self.functions[name]['nfnc']))]
+		state[name] = 1
+		while stack:
+			current, children = stack[-1]
+			for child in children:
+				if state.get(child) == 1:
+					raise CycleError(f'{child} refers to itself')
+				if child not in state:
+					if child not in self.functions:
+						if missing_ok:
+							continue
+						raise KeyError(child)
+					state[child] = 1
+					stack.append((child, iter(self.functions[child]['nfnc'])))
+					break
+			else:
+				stack.pop()
+				state[current] = 2
+				order.append(current)
+		return order
+
+	# Own statement of a function, parsed once
+	def compile(self, name: str) -> ast.expr:
+		if name not in self.compiled:
+			self.compiled[name] = compile_statement(self.functions[name]['stmt'].replace('$', '_'))
+		return self.compiled[name]
+
+	# Variables of a function and of everything it refers to, without inserting any statements
+	def variables(self, name: str) -> List[str]:
+		bvar = set()
+		for current in self.order(name):
+			bvar.update(self.functions[current]['bvar'])
+		return sorted(bvar)
+
+	# Length the inlined statement of every function in order would have, computed without building them
+	def inline_sizes(self, order: List[str]) -> Dict[str, int]:
+		sizes = {}
+		for current in order:
+			stmt = self.functions[current]['stmt']
+			sizes[current] = len(stmt) + sum(stmt.count(f'${target}') * (sizes[target] + 1 - len(target)) for target in self.functions[current]['nfnc'])
+		return sizes
+
+	# Statement of a function with every nested function inserted, refused when it would be longer than limit
+	def inline(self, name: str, limit: int = max_inline_size) -> str:
+		order = self.order(name)
+		size = len(self.inlined[name]) if name in self.inlined else self.inline_sizes(order)[name]
+		if size > limit:
+			raise InlineSizeError(f'{name} would be {size} characters long when inlined')
+		for current in order:
+			if current not in self.inlined:
+				stmt = self.functions[current]['stmt']
+				for target in self.functions[current]['nfnc']:
+					stmt = stmt.replace(f'${target}', f'({self.inlined[target]})')
+				self.inlined[current] = stmt
+		return self.inlined[name]
+
+	# Truth vector of a function over the given variables, nested functions are evaluated once each instead of being inserted
+	def vector(self, name: str, variables: Sequence[str]) -> int:
+		masks, full = columns(variables), (1 << (1 << len(variables))) - 1
+		for current in self.order(name):
+			masks['_' + current] = evaluate(self.compile(current), masks, full)
+		return masks['_' + name]
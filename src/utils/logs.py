@@ -0,0 +1,56 @@
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+# -------------------------> Globals
+
+log_path = 'storage/discord.log'
+max_bytes = 4 * 1024 * 1024  # Segment size, small enough for !dump log to upload
+backup_count = 10  # Compressed segments kept next to the current one
+
+# -------------------------> Functions
+
+# Path of a log segment, 0 is the one being written and older ones are gzipped
+def segment_path(index: int = 0, file_path: str = log_path) -> str:
+	return file_path if index == 0 else f'{file_path}.{index}.gz'
+
+def gzip_namer(name: str) -> str:
+	return name + '.gz'
+
+# Compresses a full segment into its backup name, the handler reopens a fresh file afterwards
+def gzip_rotator(source: str, dest: str) -> None:
+	with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+		shutil.copyfileobj(src, dst)
+	os.remove(source)
+
+# Moves all file writes to a background thread, the event loop only puts records on a queue
+def setup_logging(level: int = logging.INFO, file_path: str = log_path, json_lines: bool = False, fmt: Optional[str] = None, datefmt: Optional[str] = None) -> QueueListener:
+	handler = RotatingFileHandler(file_path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+	handler.namer, handler.rotator = gzip_namer, gzip_rotator
+	handler.setFormatter(JSONFormatter() if json_lines else logging.Formatter(fmt, datefmt))
+
+	records: queue.SimpleQueue = queue.SimpleQueue()
+	root = logging.getLogger()
+	root.setLevel(level)
+	root.addHandler(QueueHandler(records))
+
+	listener = QueueListener(records, handler, respect_handler_level=True)
+	listener.start()
+	atexit.register(listener.stop)  # Writes out whatever is still queued
+	return listener
+
+# -------------------------> Classes
+
+# One json object per line, for feeding the log into other tools
+class JSONFormatter(logging.Formatter):
+	def format(self, record: logging.LogRecord) -> str:
+		entry = {'time': record.created, 'level': record.levelname, 'logger': record.name, 'message': record.getMessage()}
+		if record.exc_info:
+			entry['exception'] = self.formatException(record.exc_info)
+		return json.dumps(entry, ensure_ascii=False)
@@ -0,0 +1,196 @@
+import time
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from utils.logic import FunctionGraph, columns
+
+# -------------------------> Globals
+
+qm_limit = 10  # Variables up to which Quine-McCluskey is tried before the heuristic
+Cube = Tuple[int, int]  # (value, mask), mask bits are variables the cube does not care about
+
+# -------------------------> Functions
+
+def popcount(value: int) -> int:
+	return bin(value).count('1')
+
+# Raises TimeoutError once the deadline has passed
+def check(deadline: float) -> None:
+	if time.monotonic() > deadline:
+		raise TimeoutError
+
+# Rows a cube covers as a truth vector, bit i of a row number belongs to variable n - 1 - i
+def coverage(cube: Cube, masks: List[int], full: int) -> int:
+	value, mask = cube
+	covered = full
+	for bit, column in enumerate(masks):
+		if not mask >> bit & 1:
+			covered &= column if value >> bit & 1 else full ^ column
+	return covered
+
+# Column of every row bit, least significant bit first
+def bit_columns(variables: Sequence[str]) -> List[int]:
+	named = columns(variables)
+	return [named[var] for var in reversed(variables)]
+
+# Merges implicants differing in one variable until nothing merges anymore, returns the prime implicants
+def prime_implicants(minterms: List[int], variables: int, deadline: float) -> Set[Cube]:
+	current, primes = {(minterm, 0) for minterm in minterms}, set()
+	while current:
+		merged, used = set(), set()
+		for value, mask in current:
+			check(deadline)
+			for bit in range(variables):
+				flag = 1 << bit
+				if not (mask | value) & flag and (value | flag, mask) in current:
+					merged.add((value, mask | flag))
+					used.add((value, mask))
+					used.add((value | flag, mask))
+		primes |= current - used
+		current = merged
+	return primes
+
+# Picks the prime covering the most remaining rows until every row is covered
+def greedy_cover(covers: Dict[Cube, int], remaining: int, deadline: float) -> List[Cube]:
+	cover = []
+	while remaining:
+		check(deadline)
+		best = max(covers, key=lambda prime: (popcount(covers[prime] & remaining), popcount(prime[1])))
+		cover.append(best)
+		remaining &= ~covers[best]
+	return cover
+
+# Cost of a cover: fewest terms first, then fewest literals
+def cost(cover: List[Cube], variables: int) -> Tuple[int, int]:
+	return len(cover), sum(variables - popcount(mask) for _, mask in cover)
+
+# Branch and bound over the primes covering the rows essential primes leave, starting from the greedy cover
+# Returns the cheapest cover found and whether the search finished before the deadline
+def exact_cover(covers: Dict[Cube, int], remaining: int, variables: int, deadline: float) -> Tuple[List[Cube], bool]:
+	best = greedy_cover(covers, remaining, deadline)
+	best_cost = cost(best, variables)
+
+	def branch(chosen: List[Cube], remaining: int) -> None:
+		nonlocal best, best_cost
+		check(deadline)
+		if not remaining:
+			if cost(chosen, variables) < best_cost:
+				best, best_cost = list(chosen), cost(chosen, variables)
+			return
+
+		# Every prime covers at most the widest one's share, so at least this many more terms are needed
+		widest = max(popcount(covered & remaining) for covered in covers.values())
+		if (len(chosen) - (-popcount(remaining) // widest), cost(chosen, variables)[1]) >= best_cost:
+			return
+
+		# Branch on the row with the fewest primes covering it
+		owners = None
+		row = remaining
+		while row:
+			lowest = row & -row
+			candidates = [prime for prime, covered in covers.items() if covered & lowest]
+			if owners is None or len(candidates) < len(owners):
+				owners = candidates
+				if len(owners) == 1:
+					break
+			row ^= lowest
+
+		for prime in sorted(owners, key=lambda prime: (-popcount(covers[prime] & remaining), -popcount(prime[1]))):
+			chosen.append(prime)
+			branch(chosen, remaining & ~covers[prime])
+			chosen.pop()
+
+	try:
+		branch([], remaining)
+	except TimeoutError:
+		return best, False
+	return best, True
+
+# Picks essential primes first, then solves the rest exactly, returns the cover and whether it is minimal
+def select_cover(primes: Set[Cube], on: int, variables: int, masks: List[int], full: int, deadline: float) -> Tuple[List[Cube], bool]:
+	covers = {prime: coverage(prime, masks, full) for prime in primes}
+	cover, remaining = [], on
+
+	# Essential primes are the only ones covering some row
+	row = on
+	while row:
+		check(deadline)
+		lowest = row & -row
+		owners = [prime for prime, covered in covers.items() if covered & lowest]
+		if len(owners) == 1 and owners[0] not in cover:
+			cover.append(owners[0])
+			remaining &= ~covers[owners[0]]
+		row ^= lowest
+
+	rest, exact = exact_cover(covers, remaining, variables, deadline)
+	return cover + rest, exact
+
+# Espresso-style heuristic: expand every uncovered row into a large cube inside the on-set, then drop redundant cubes
+def expand_cover(on: int, variables: int, masks: List[int], full: int, deadline: float) -> Tuple[List[Cube], bool]:
+	cubes: Dict[Cube, int] = {}
+	remaining = on
+	while remaining:
+		lowest = remaining & -remaining
+		cube = (lowest.bit_length() - 1, 0)
+		if time.monotonic() > deadline:
+			# Out of time, every leftover row becomes a term of its own without computing any more coverage
+			for row, bit in enumerate(reversed(bin(remaining)[2:])):
+				if bit == '1':
+					cubes[(row, 0)] = 1 << row
+			return list(cubes), False
+		for bit in range(variables):  # Raise one literal at a time while the cube stays inside the on-set
+			wider = (cube[0] & ~(1 << bit), cube[1] | 1 << bit)
+			if not coverage(wider, masks, full) & ~on & full:
+				cube = wider
+		cubes[cube] = coverage(cube, masks, full)
+		remaining &= ~cubes[cube]
+
+	# Irredundant: drop cubes the others already cover, smallest first
+	for cube in sorted(cubes, key=lambda cube: popcount(cube[1])):
+		if time.monotonic() > deadline:
+			break
+		others = 0
+		for other, covered in cubes.items():
+			if other != cube:
+				others |= covered
+		if not cubes[cube] & ~others:
+			del cubes[cube]
+	return list(cubes), True
+
+# Writes cubes as a sum of products in !b set syntax
+def format_cover(cover: List[Cube], variables: Sequence[str]) -> str:
+	terms = []
+	for value, mask in sorted(cover, key=lambda cube: (popcount(cube[1]), -cube[0])):
+		term = ''
+		for i, var in enumerate(variables):
+			bit = len(variables) - 1 - i
+			if not mask >> bit & 1:
+				term += var if value >> bit & 1 else f'!{var}'
+		terms.append(term or '1')
+	return ' + '.join(terms) or '0'
+
+# Minimizes a truth vector into a sum of products within budget seconds, returns (expression, method, exact)
+def minimize(vector: int, variables: Sequence[str], budget: float = 5.0, deadline: Optional[float] = None) -> Tuple[str, str, bool]:
+	deadline = deadline or time.monotonic() + budget
+	full = (1 << (1 << len(variables))) - 1
+	on = vector & full
+	if on in (0, full):
+		return ('1' if on else '0'), 'constant', True
+	masks = bit_columns(variables)
+
+	if len(variables) <= qm_limit:
+		try:
+			minterms = [row for row in range(1 << len(variables)) if on >> row & 1]
+			primes = prime_implicants(minterms, len(variables), deadline)
+			cover, exact = select_cover(primes, on, len(variables), masks, full, deadline)
+			return format_cover(cover, variables), 'Quine-McCluskey', exact
+		except TimeoutError:
+			deadline = max(deadline, time.monotonic() + budget / 2)  # Leave the heuristic some time of its own
+
+	cover, complete = expand_cover(on, len(variables), masks, full, deadline)
+	return format_cover(cover, variables), 'Espresso heuristic', complete
+
+# Evaluates a stored function and minimizes it, meant for a worker process so neither step blocks the bot
+def minimize_function(definitions: Dict[str, dict], name: str, variables: Sequence[str], budget: float = 5.0) -> Tuple[str, str, bool]:
+	deadline = time.monotonic() + budget
+	graph = FunctionGraph.from_json({'functions': definitions})
+	return minimize(graph.vector(name, variables), variables, budget, deadline)
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from utils.files import atomic_write
+
+# -------------------------> Globals
+
+# Setup environment
+log = logging.getLogger(__name__)
+window = 1024  # Latest samples every histogram keeps
+quantiles = (50, 95, 99)
+
+# -------------------------> Classes
+
+# Latencies of one thing in a fixed-size ring buffer, plus running totals over everything ever observed
+class Histogram:
+	def __init__(self, size: int = window):
+		self.samples: Deque[float] = deque(maxlen=size)
+		self.count = 0
+		self.total = 0.0
+		self.worst = 0.0
+
+	def observe(self, seconds: float) -> None:
+		self.samples.append(seconds)
+		self.count += 1
+		self.total += seconds
+		self.worst = max(self.worst, seconds)
+
+	# Percentiles over the samples still in the buffer, nearest rank
+	def percentiles(self, ranks: Sequence[int] = quantiles) -> List[float]:
+		ordered = sorted(self.samples)
+		if not ordered:
+			return [0.0 for _ in ranks]
+		return [ordered[min(len(ordered) - 1, max(0, -(-rank * len(ordered) // 100) - 1))] for rank in ranks]
+
+# Every histogram of the bot, grouped by kind: command, listener, handler, api and loop
+class Registry:
+	def __init__(self):
+		self.histograms: Dict[Tuple[str, str], Histogram] = {}
+
+	def observe(self, kind: str, name: str, seconds: float) -> None:
+		histogram = self.histograms.get((kind, name))
+		if histogram is None:
+			histogram = self.histograms[(kind, name)] = Histogram()
+		histogram.observe(seconds)
+
+	@contextmanager
+	def time(self, kind: str, name: str) -> Iterator[None]:
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.observe(kind, name, time.perf_counter() - start)
+
+	# Table of the slowest entries by p99, optionally of one kind only
+	def report(self, kind: Optional[str] = None, limit: int = 15) -> List[str]:
+		rows = []
+		for (entry_kind, name), histogram in self.histograms.items():
+			if kind is None or entry_kind == kind:
+				rows.append((histogram.percentiles(), entry_kind, name, histogram.count))
+		rows.sort(key=lambda row: row[0][-1], reverse=True)
+
+		lines = [f'{"kind":<8} {"name":<32} {"count":>7} {"p50":>8} {"p95":>8} {"p99":>8}']
+		for (p50, p95, p99), entry_kind, name, count in rows[:limit]:
+			lines.append(f'{entry_kind:<8} {name[:32]:<32} {count:>7} {p50 * 1e3:>6.1f}ms {p95 * 1e3:>6.1f}ms {p99 * 1e3:>6.1f}ms')
+		return lines
+
+	# Everything in the Prometheus text exposition format, as summaries in seconds
+	def prometheus(self) -> str:
+		lines = ['# HELP dotobot_latency_seconds Latency of commands, listeners, message handlers, API calls and event loop lag', '# TYPE dotobot_latency_seconds summary']
+		for (kind, name), histogram in sorted(self.histograms.items()):
+			labels = f'kind="{kind}",name="{name.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+			for rank, value in zip(quantiles, histogram.percentiles()):
+				lines.append(f'dotobot_latency_seconds{{{labels},quantile="{rank / 100}"}} {value:.6f}')
+			lines.append(f'dotobot_latency_seconds_sum{{{labels}}} {histogram.total:.6f}')
+			lines.append(f'dotobot_latency_seconds_count{{{labels}}} {histogram.count}')
+		return '\n'.join(lines) + '\n'
+
+# Measures how late the event loop wakes up a sleeping task, which is how long something else blocked it
+class LoopMonitor:
+	def __init__(self, registry: Registry, interval: float = 0.5, export_path: Optional[str] = None, export_every: float = 15.0):
+		self.registry = registry
+		self.interval = interval
+		self.export_path = export_path  # Prometheus text file, None to not write one
+		self.export_every = export_every
+		self.task: Optional[asyncio.Task] = None
+
+	def start(self) -> None:
+		if self.task is None or self.task.done():
+			self.task = asyncio.get_running_loop().create_task(self.run())
+
+	async def run(self) -> None:
+		loop = asyncio.get_running_loop()
+		exported = loop.time()
+		while True:
+			start = loop.time()
+			await asyncio.sleep(self.interval)
+			self.registry.observe('loop', 'lag', max(0.0, loop.time() - start - self.interval))
+			if self.export_path and loop.time() - exported >= self.export_every:
+				exported = loop.time()
+				try:
+					await loop.run_in_executor(None, atomic_write, self.export_path, self.registry.prometheus())
+				except OSError as err:
+					log.error(f'Could not write {self.export_path}: {err}')
+
+metrics = Registry()  # Shared by main.py, the dispatcher and the System cog
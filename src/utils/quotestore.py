@@ -0,0 +1,414 @@
+import heapq
+import json
+import logging
+import math
+import re
+import sqlite3
+import sys
+from bisect import bisect_left, insort
+from collections import Counter
+from os import listdir, path
+from typing import Dict, Iterator, List, Optional, Union
+
+# Run as a script only src/utils is on the path, utils itself lives one level up
+if __name__ == '__main__':
+	sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..'))
+
+from utils.files import atomic_dump
+
+# -------------------------> Globals
+
+# Setup environment
+log = logging.getLogger(__name__)
+Quote = Dict[str, Union[str, int, List[int]]]
+FIELDS = ('quote', 'author')
+batch_size = 64  # Rows the SQLite engine fetches per query when quotes are read lazily
+
+# -------------------------> Functions
+
+# Splits text into lowercase search tokens
+def tokenize(text: str) -> List[str]:
+	return re.findall(r'\w+', text.lower())
+
+# -------------------------> Classes
+
+# Incrementally maintained token -> document postings with prefix lookup
+class InvertedIndex:
+	def __init__(self):
+		self.postings: Dict[str, Dict[int, int]] = {}  # token -> {document: term frequency}
+		self.vocabulary: List[str] = []  # Sorted tokens, used for prefix ranges
+		self.documents: Dict[int, str] = {}
+
+	def __len__(self) -> int:
+		return len(self.documents)
+
+	# Indexes a document, replacing its previous contents
+	def add(self, doc_id: int, text: str) -> None:
+		if self.documents.get(doc_id) == text:
+			return
+		self.remove(doc_id)
+		self.documents[doc_id] = text
+		for token, count in Counter(tokenize(text)).items():
+			if token not in self.postings:
+				self.postings[token] = {}
+				insort(self.vocabulary, token)
+			self.postings[token][doc_id] = count
+
+	def remove(self, doc_id: int) -> None:
+		text = self.documents.pop(doc_id, None)
+		if text is None:
+			return
+		for token in set(tokenize(text)):
+			postings = self.postings[token]
+			del postings[doc_id]
+			if not postings:
+				del self.postings[token]
+				del self.vocabulary[bisect_left(self.vocabulary, token)]
+
+	# Returns every indexed token starting with prefix
+	def expand(self, prefix: str) -> List[str]:
+		start = end = bisect_left(self.vocabulary, prefix)
+		while end < len(self.vocabulary) and self.vocabulary[end].startswith(prefix):
+			end += 1
+		return self.vocabulary[start:end]
+
+	# Scores the documents matching a single term, exact token hits weigh more than prefix hits
+	def match(self, term: str) -> Dict[int, float]:
+		scores: Dict[int, float] = {}
+		for token in self.expand(term):
+			postings = self.postings[token]
+			weight = (2 if token == term else 1) * math.log(1 + len(self.documents) / len(postings))
+			for doc_id, count in postings.items():
+				scores[doc_id] = scores.get(doc_id, 0) + weight * (1 + math.log(count))
+		return scores
+
+# In-memory quote collection of a single guild, flushed to disk by its owner
+class QuoteStore:
+	def __init__(self, file_path: str):
+		self.path = file_path
+		self.dirty = False
+		self.quotes: Dict[str, Quote] = self.load()
+		self.next_id = max(map(int, self.quotes.keys()), default=-1) + 1
+		self.index: Optional[Dict[str, InvertedIndex]] = None  # Built on the first search
+		self.version = 0  # Bumped on every change, lets readers invalidate derived data
+
+	# Reads the guild database from disk, missing databases are treated as empty
+	def load(self) -> Dict[str, Quote]:
+		if not path.isfile(self.path):
+			return {}
+		log.debug(f'Loading {self.path}...')
+		with open(self.path, 'r', encoding='utf-8') as file:
+			return json.load(file)
+
+	def __len__(self) -> int:
+		return len(self.quotes)
+
+	def __contains__(self, quote_id: int) -> bool:
+		return str(quote_id) in self.quotes
+
+	def get(self, quote_id: int) -> Optional[Quote]:
+		return self.quotes.get(str(quote_id))
+
+	def ids(self) -> Iterator[int]:
+		return map(int, self.quotes.keys())
+
+	def values(self) -> Iterator[Quote]:
+		return iter(self.quotes.values())
+
+	# Lazily yields quotes in id order
+	def sorted_values(self) -> Iterator[Quote]:
+		return (self.quotes[str(quote_id)] for quote_id in sorted(self.ids()))
+
+	# Returns the given amount of quotes with the highest ids, in id order
+	def last(self, amount: int) -> List[Quote]:
+		return [self.quotes[str(quote_id)] for quote_id in reversed(heapq.nlargest(amount, self.ids()))]
+
+	# Adds a quote under the next free id and returns that id
+	def add(self, quote: str, author: str) -> int:
+		quote_id = self.next_id
+		self.put(quote_id, {'quote': quote, 'author': author, 'remove_votes': [], 'remove_vetos': [], 'id': quote_id})
+		return quote_id
+
+	# Stores a quote under a specific id, replacing whatever was there
+	def put(self, quote_id: int, quote: Quote) -> None:
+		self.quotes[str(quote_id)] = quote
+		self.next_id = max(self.next_id, quote_id + 1)
+		self.dirty = True
+		self.version += 1
+		if self.index:
+			for field in FIELDS:
+				self.index[field].add(quote_id, quote[field])
+
+	# Removes a quote and returns it, the highest id becomes free again like before
+	def remove(self, quote_id: int) -> Optional[Quote]:
+		quote = self.quotes.pop(str(quote_id), None)
+		if quote is None:
+			return None
+		if quote_id == self.next_id - 1:
+			self.next_id = max(map(int, self.quotes.keys()), default=-1) + 1
+		self.dirty = True
+		self.version += 1
+		if self.index:
+			for field in FIELDS:
+				self.index[field].remove(quote_id)
+		return quote
+
+	# Builds the search index of every field
+	def build_index(self) -> Dict[str, InvertedIndex]:
+		self.index = {field: InvertedIndex() for field in FIELDS}
+		for key, quote in self.quotes.items():
+			for field in FIELDS:
+				self.index[field].add(int(key), quote[field])
+		log.debug(f'Indexed {len(self.quotes)} quotes of {self.path}')
+		return self.index
+
+	# Finds quotes in which every term prefixes a word of the given field (or of either field), best matches first
+	# Unlike the SQLite engine a term does not match in the middle of a word: "ont" finds "ontbijt" but not "don't"
+	def search(self, key: str, field: Optional[str] = None) -> List[Quote]:
+		terms = tokenize(key)
+		if not terms:
+			# Nothing word-like to look up, so match the raw text like before the index existed
+			needles = key.lower().split()
+			return [quote for quote in self.sorted_values() if all(any(needle in quote[name].lower() for name in ([field] if field else FIELDS)) for needle in needles)]
+
+		index = self.index or self.build_index()
+		scores: Optional[Dict[int, float]] = None
+		for term in terms:
+			term_scores: Dict[int, float] = {}
+			for name in [field] if field else FIELDS:
+				for doc_id, score in index[name].match(term).items():
+					term_scores[doc_id] = term_scores.get(doc_id, 0) + score
+
+			# Intersect with the documents that matched every previous term
+			if scores is None:
+				scores = term_scores
+			else:
+				scores = {doc_id: score + term_scores[doc_id] for doc_id, score in scores.items() if doc_id in term_scores}
+			if not scores:
+				return []
+
+		return [self.quotes[str(doc_id)] for doc_id in sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))]
+
+	# Returns the database in its on-disk json layout
+	def export(self) -> Dict[str, Quote]:
+		return self.quotes
+
+	# Writes the guild database to disk if anything changed since the last flush
+	def flush(self) -> bool:
+		if not self.dirty:
+			return False
+		self.dirty = False
+		try:
+			atomic_dump(self.path, self.quotes)
+		except Exception:
+			self.dirty = True
+			raise
+		log.debug(f'Flushed {len(self.quotes)} quotes to {self.path}')
+		return True
+
+# Lazily loaded quote stores of every guild
+class QuoteDatabase:
+	def __init__(self, directory: str = 'storage/db/quotes'):
+		self.directory = directory
+		self.stores: Dict[str, QuoteStore] = {}
+
+	def __getitem__(self, guild_id: Union[str, int]) -> QuoteStore:
+		guild_id = str(guild_id)
+		if guild_id not in self.stores:
+			self.stores[guild_id] = QuoteStore(path.join(self.directory, f'{guild_id}.json'))
+		return self.stores[guild_id]
+
+	# Flushes every changed guild, returns the amount of guilds written
+	def flush(self) -> int:
+		flushed = 0
+		for guild_id, store in self.stores.items():
+			try:
+				flushed += store.flush()
+			except Exception as err:
+				log.error(f'Could not flush quotes of guild {guild_id}: {err}')
+		return flushed
+
+# Quote collection of a single guild, backed by a shared SQLite database
+class SQLiteQuoteStore:
+	def __init__(self, db: 'SQLiteQuoteDatabase', guild_id: int):
+		self.db = db
+		self.conn = db.conn
+		self.guild_id = guild_id
+		self.version = 0  # Bumped on every change, lets readers invalidate derived data
+
+	# Converts a database row into the json layout the cog works with
+	@staticmethod
+	def to_quote(row: sqlite3.Row) -> Quote:
+		return {'quote': row['quote'], 'author': row['author'], 'remove_votes': json.loads(row['remove_votes']), 'remove_vetos': json.loads(row['remove_vetos']), 'id': row['id']}
+
+	def __len__(self) -> int:
+		return self.conn.execute('SELECT COUNT(*) FROM quotes WHERE guild_id = ?', (self.guild_id,)).fetchone()[0]
+
+	def __contains__(self, quote_id: int) -> bool:
+		return self.conn.execute('SELECT 1 FROM quotes WHERE guild_id = ? AND id = ?', (self.guild_id, quote_id)).fetchone() is not None
+
+	@property
+	def next_id(self) -> int:
+		return self.conn.execute('SELECT COALESCE(MAX(id), -1) + 1 FROM quotes WHERE guild_id = ?', (self.guild_id,)).fetchone()[0]
+
+	def get(self, quote_id: int) -> Optional[Quote]:
+		row = self.conn.execute('SELECT * FROM quotes WHERE guild_id = ? AND id = ?', (self.guild_id, quote_id)).fetchone()
+		return self.to_quote(row) if row else None
+
+	def ids(self) -> Iterator[int]:
+		return (row[0] for row in self.conn.execute('SELECT id FROM quotes WHERE guild_id = ? ORDER BY id', (self.guild_id,)))
+
+	def values(self) -> Iterator[Quote]:
+		return map(self.to_quote, self.conn.execute('SELECT * FROM quotes WHERE guild_id = ? ORDER BY id', (self.guild_id,)))
+
+	# Lazily yields quotes in id order, fetched in batches after the last id seen so no statement stays open in between
+	def sorted_values(self) -> Iterator[Quote]:
+		last_id = -1
+		while True:
+			rows = self.conn.execute('SELECT * FROM quotes WHERE guild_id = ? AND id > ? ORDER BY id LIMIT ?', (self.guild_id, last_id, batch_size)).fetchall()
+			yield from map(self.to_quote, rows)
+			if len(rows) < batch_size:
+				return
+			last_id = rows[-1]['id']
+
+	# Returns the given amount of quotes with the highest ids, in id order
+	def last(self, amount: int) -> List[Quote]:
+		return list(map(self.to_quote, reversed(self.conn.execute('SELECT * FROM quotes WHERE guild_id = ? ORDER BY id DESC LIMIT ?', (self.guild_id, amount)).fetchall())))
+
+	# Adds a quote under the next free id and returns that id
+	def add(self, quote: str, author: str) -> int:
+		quote_id = self.next_id
+		self.put(quote_id, {'quote': quote, 'author': author, 'remove_votes': [], 'remove_vetos': [], 'id': quote_id})
+		return quote_id
+
+	# Stores a quote under a specific id, replacing whatever was there
+	def put(self, quote_id: int, quote: Quote) -> None:
+		with self.conn:
+			self.conn.execute(
+				'INSERT INTO quotes (guild_id, id, quote, author, remove_votes, remove_vetos) VALUES (?, ?, ?, ?, ?, ?) '
+				'ON CONFLICT (guild_id, id) DO UPDATE SET quote = excluded.quote, author = excluded.author, remove_votes = excluded.remove_votes, remove_vetos = excluded.remove_vetos',
+				(self.guild_id, quote_id, quote['quote'], quote['author'], json.dumps(quote['remove_votes']), json.dumps(quote['remove_vetos']))
+			)
+		self.version += 1
+
+	# Removes a quote and returns it
+	def remove(self, quote_id: int) -> Optional[Quote]:
+		quote = self.get(quote_id)
+		if quote is not None:
+			with self.conn:
+				self.conn.execute('DELETE FROM quotes WHERE guild_id = ? AND id = ?', (self.guild_id, quote_id))
+			self.version += 1
+		return quote
+
+	# Finds quotes containing every term anywhere in the given field, or in either field if none is given
+	# Unlike the json engine terms also match in the middle of a word and results are not ranked by relevance when scanning
+	def search(self, key: str, field: Optional[str] = None) -> List[Quote]:
+		columns, terms = [field] if field else list(FIELDS), key.split()
+		if not terms:
+			return list(self.values())
+
+		# The trigram index can only answer terms of three or more characters
+		if self.db.fts and min(map(len, terms)) >= 3:
+			phrases = ' AND '.join('"' + term.replace('"', '""') + '"' for term in terms)
+			rows = self.conn.execute(
+				'SELECT quotes.* FROM quotes_fts JOIN quotes ON quotes.rowid = quotes_fts.rowid WHERE quotes_fts MATCH ? AND quotes.guild_id = ? ORDER BY quotes_fts.rank, quotes.id',
+				(f'{{{" ".join(columns)}}}: ({phrases})', self.guild_id)
+			)
+		else:
+			patterns = ['%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%' for term in terms]
+			condition = ' AND '.join('(' + ' OR '.join(f"{column} LIKE ? ESCAPE '\\'" for column in columns) + ')' for _ in terms)
+			rows = self.conn.execute(f'SELECT * FROM quotes WHERE guild_id = ? AND {condition} ORDER BY id', (self.guild_id, *[pattern for pattern in patterns for _ in columns]))
+		return list(map(self.to_quote, rows))
+
+	# Returns the database in the json layout
+	def export(self) -> Dict[str, Quote]:
+		return {str(quote['id']): quote for quote in self.values()}
+
+	# Every change is committed right away
+	def flush(self) -> bool:
+		return False
+
+# SQLite quote database shared by every guild
+class SQLiteQuoteDatabase:
+	def __init__(self, file_path: str = 'storage/db/quotes.sqlite3'):
+		self.path = file_path
+		self.conn = sqlite3.connect(file_path)
+		self.conn.row_factory = sqlite3.Row
+		self.conn.execute('PRAGMA journal_mode = WAL')
+		self.fts = self.create_tables()
+		self.stores: Dict[str, SQLiteQuoteStore] = {}
+
+	# Creates the schema, returns whether full-text search is available
+	def create_tables(self) -> bool:
+		with self.conn:
+			self.conn.executescript("""
+				CREATE TABLE IF NOT EXISTS quotes (
+					rowid INTEGER PRIMARY KEY,
+					guild_id INTEGER NOT NULL,
+					id INTEGER NOT NULL,
+					quote TEXT NOT NULL,
+					author TEXT NOT NULL,
+					remove_votes TEXT NOT NULL DEFAULT '[]',
+					remove_vetos TEXT NOT NULL DEFAULT '[]',
+					UNIQUE (guild_id, id)
+				);
+				CREATE INDEX IF NOT EXISTS quotes_author ON quotes (guild_id, author COLLATE NOCASE);
+			""")
+		try:
+			with self.conn:
+				self.conn.executescript("""
+					CREATE VIRTUAL TABLE IF NOT EXISTS quotes_fts USING fts5(quote, author, content='quotes', content_rowid='rowid', tokenize='trigram');
+					CREATE TRIGGER IF NOT EXISTS quotes_ai AFTER INSERT ON quotes BEGIN
+						INSERT INTO quotes_fts (rowid, quote, author) VALUES (new.rowid, new.quote, new.author);
+					END;
+					CREATE TRIGGER IF NOT EXISTS quotes_ad AFTER DELETE ON quotes BEGIN
+						INSERT INTO quotes_fts (quotes_fts, rowid, quote, author) VALUES ('delete', old.rowid, old.quote, old.author);
+					END;
+					CREATE TRIGGER IF NOT EXISTS quotes_au AFTER UPDATE ON quotes BEGIN
+						INSERT INTO quotes_fts (quotes_fts, rowid, quote, author) VALUES ('delete', old.rowid, old.quote, old.author);
+						INSERT INTO quotes_fts (rowid, quote, author) VALUES (new.rowid, new.quote, new.author);
+					END;
+				""")
+			return True
+		except sqlite3.OperationalError as err:
+			log.warning(f'SQLite has no fts5 trigram support, quote search falls back to scanning: {err}')
+			return False
+
+	def __getitem__(self, guild_id: Union[str, int]) -> SQLiteQuoteStore:
+		guild_id = str(guild_id)
+		if guild_id not in self.stores:
+			self.stores[guild_id] = SQLiteQuoteStore(self, int(guild_id))
+		return self.stores[guild_id]
+
+	# Every change is committed right away, nothing to flush
+	def flush(self) -> int:
+		return 0
+
+	def close(self) -> None:
+		self.conn.close()
+
+# Imports every json quote database in directory into the SQLite database, returns the amount of quotes imported
+def migrate(directory: str = 'storage/db/quotes', file_path: str = 'storage/db/quotes.sqlite3') -> int:
+	db, imported = SQLiteQuoteDatabase(file_path), 0
+	for file in sorted(listdir(directory)):
+		if not file.endswith('.json'):
+			continue
+		store = QuoteStore(path.join(directory, file))
+		rows = [(int(file[:-5]), int(key), quote['quote'], quote['author'], json.dumps(quote['remove_votes']), json.dumps(quote['remove_vetos'])) for key, quote in store.quotes.items()]
+		with db.conn:
+			db.conn.executemany(
+				'INSERT INTO quotes (guild_id, id, quote, author, remove_votes, remove_vetos) VALUES (?, ?, ?, ?, ?, ?) '
+				'ON CONFLICT (guild_id, id) DO UPDATE SET quote = excluded.quote, author = excluded.author, remove_votes = excluded.remove_votes, remove_vetos = excluded.remove_vetos',
+				rows
+			)  # Not INSERT OR REPLACE, its implicit delete skips the quotes_ad trigger and leaves stale rows in quotes_fts
+		log.info(f'Migrated {len(rows)} quotes from {file}')
+		imported += len(rows)
+	db.close()
+	return imported
+
+# -------------------------> Main
+
+# One-shot migration: python src/utils/quotestore.py [json directory] [sqlite file]
+if __name__ == '__main__':
+	logging.basicConfig(level=logging.INFO)
+	print(f'Migrated {migrate(*sys.argv[1:3])} quotes')
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os import path
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from utils.files import atomic_dump
+from utils.gamematch import GameIndex
+
+# -------------------------> Globals
+
+# Setup environment
+log = logging.getLogger(__name__)
+
+# -------------------------> Classes
+
+# The owned games of a single Steam account
+class Library:
+	def __init__(self, steam_id: str, games: Dict[int, str], fetched: float):
+		self.steam_id = steam_id
+		self.games = games  # appid -> name
+		self.appids = frozenset(games)
+		self.fetched = fetched
+		self._index: Optional[GameIndex] = None
+
+	# Fuzzy game search, built the first time this library is searched
+	@property
+	def index(self) -> GameIndex:
+		if self._index is None:
+			self._index = GameIndex(self.games)
+		return self._index
+
+	# Builds a library from a GetOwnedGames game list
+	@classmethod
+	def from_response(cls, steam_id: str, games: List[dict]) -> 'Library':
+		return cls(steam_id, {game['appid']: game.get('name', str(game['appid'])) for game in games}, time.time())
+
+	def to_json(self) -> dict:
+		return {'fetched': self.fetched, 'games': {str(appid): name for appid, name in self.games.items()}}
+
+	@classmethod
+	def from_json(cls, steam_id: str, data: dict) -> 'Library':
+		return cls(steam_id, {int(appid): name for appid, name in data['games'].items()}, data['fetched'])
+
+# Caches Steam libraries for a while and fetches missing ones concurrently, off the event loop
+class LibraryCache:
+	def __init__(self, fetch: Callable[[str], List[dict]], ttl: float = 6 * 60 * 60, concurrency: int = 8, file_path: Optional[str] = None):
+		self.fetch = fetch  # Blocking call returning the GetOwnedGames game list of a steam id
+		self.ttl = ttl
+		self.concurrency = concurrency
+		self.path = file_path
+		self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='steam')
+		self.libraries: Dict[str, Library] = {}
+		self.owners: Dict[int, Set[str]] = {}  # appid -> steam ids owning it
+		self.pending: Dict[str, asyncio.Future] = {}  # Fetches in flight, shared by everyone asking for the same id
+		self._catalog: Optional[GameIndex] = None
+		self.load()
+
+	# Reads persisted libraries, if persistence is enabled
+	def load(self) -> None:
+		if not self.path or not path.isfile(self.path):
+			return
+		log.debug(f'Loading {self.path}...')
+		with open(self.path, 'r', encoding='utf-8') as file:
+			for steam_id, data in json.load(file).items():
+				self.store(Library.from_json(steam_id, data))
+
+	# Caches a library and moves its owner entries over from the previous copy
+	def store(self, library: Library) -> None:
+		self.invalidate(library.steam_id)
+		self.libraries[library.steam_id] = library
+		for appid in library.appids:
+			self.owners.setdefault(appid, set()).add(library.steam_id)
+		self._catalog = None
+
+	# Every cached game of every library, for lookups that should not hit the API
+	@property
+	def catalog(self) -> GameIndex:
+		if self._catalog is None:
+			self._catalog = GameIndex({appid: name for library in self.libraries.values() for appid, name in library.games.items()})
+		return self._catalog
+
+	# Writes the cached libraries to disk in the thread pool, if persistence is enabled
+	async def dump(self) -> None:
+		if self.path:
+			snapshot = {steam_id: library.to_json() for steam_id, library in self.libraries.items()}
+			await asyncio.get_running_loop().run_in_executor(self.executor, atomic_dump, self.path, snapshot, None)
+
+	def fresh(self, steam_id: str) -> Optional[Library]:
+		library = self.libraries.get(steam_id)
+		return library if library and time.time() - library.fetched < self.ttl else None
+
+	# Drops a library so the next request fetches it again
+	def invalidate(self, steam_id: str) -> None:
+		library = self.libraries.pop(steam_id, None)
+		if library is None:
+			return
+		for appid in library.appids:
+			owners = self.owners[appid]
+			owners.discard(steam_id)
+			if not owners:
+				del self.owners[appid]
+		self._catalog = None
+
+	async def get(self, steam_id: str) -> Library:
+		return (await self.get_many([steam_id], raise_errors=True))[steam_id]
+
+	# Returns the libraries of every id, fetching the stale ones in parallel. Failed fetches fall back to a stale copy, if any
+	# Ids without any copy are left out, or raise the fetch error if raise_errors is set
+	async def get_many(self, steam_ids: Iterable[str], raise_errors: bool = False) -> Dict[str, Library]:
+		steam_ids = list(dict.fromkeys(map(str, steam_ids)))
+		missing = [steam_id for steam_id in steam_ids if not self.fresh(steam_id)]
+		if missing:
+			results = await asyncio.gather(*map(self.refresh, missing), return_exceptions=True)
+			for steam_id, result in zip(missing, results):
+				if isinstance(result, BaseException):
+					if raise_errors and steam_id not in self.libraries:
+						raise result
+					log.warning(f'Could not fetch the Steam library of {steam_id}: {result}')
+			await self.dump()
+		return {steam_id: self.libraries[steam_id] for steam_id in steam_ids if steam_id in self.libraries}
+
+	# Fetches a library in the thread pool, concurrent requests for the same id share one fetch
+	async def refresh(self, steam_id: str) -> Library:
+		if steam_id not in self.pending:
+			loop = asyncio.get_running_loop()
+			self.pending[steam_id] = loop.run_in_executor(self.executor, self.fetch, steam_id)
+		future = self.pending[steam_id]
+		try:
+			games = await asyncio.shield(future)
+		finally:
+			if self.pending.get(steam_id) is future and future.done():
+				del self.pending[steam_id]
+		library = Library.from_response(steam_id, games)
+		self.store(library)
+		return library
+
+	def close(self) -> None:
+		self.executor.shutdown(wait=False)
@@ -0,0 +1,100 @@
+import logging
+import re
+from typing import Dict, Iterable, Iterator, List, Match, Optional, Pattern, Tuple
+
+# -------------------------> Globals
+
+# Setup environment
+log = logging.getLogger(__name__)
+boundaries = frozenset(map(chr, [*range(ord(' '), ord('@') + 1), *range(ord('['), ord('`') + 1), *range(ord('{'), ord('~') + 1)]))  # Anything not a letter, to be honest
+modes = ('exact', 'substring', 'word', 'spaceless')
+
+Trigger = Tuple[str, str, str]  # (category, keyword, mode)
+
+# -------------------------> Functions
+
+# Checks whether a word trigger at text[start:end] stands on its own
+def is_word(text: str, start: int, end: int) -> bool:
+	return (start == 0 or text[start - 1] in boundaries) and (end == len(text) or text[end] in boundaries)
+
+# Turns a keyword trie into a regex, optional tails are greedy so a hit is always the longest keyword at its position
+def trie_regex(node: dict) -> str:
+	branches = [re.escape(char) + trie_regex(child) for char, child in sorted(node.items()) if char]
+	if not branches:
+		return ''
+	body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+	return f'(?:{body})?' if '' in node else body
+
+# Compiles keywords into a single prefix-factored alternation, so a hit implies every keyword prefixing it
+def compile_keywords(keywords: Iterable[str]) -> Optional[Pattern]:
+	trie: dict = {}
+	for keyword in keywords:
+		node = trie
+		for char in keyword:
+			node = node.setdefault(char, {})
+		node[''] = {}
+	return re.compile(trie_regex(trie)) if trie else None
+
+# Yields every match of pattern in text, overlapping ones too, resuming one character after each hit
+def find_overlapping(pattern: Pattern, text: str) -> Iterator[Match]:
+	match = pattern.search(text)
+	while match:
+		yield match
+		match = pattern.search(text, match.start() + 1)
+
+# -------------------------> Classes
+
+# Matches every configured trigger against a message in a single pass
+class TriggerEngine:
+	def __init__(self):
+		self.triggers: List[Trigger] = []
+		self.exact: Dict[str, List[Trigger]] = {}
+		self.implied: Dict[str, List[Trigger]] = {}  # Longest keyword at a position -> every trigger that matches there as well
+		self.spaceless_implied: Dict[str, List[Trigger]] = {}
+		self.pattern: Optional[Pattern] = None
+		self.spaceless_pattern: Optional[Pattern] = None
+
+	# Registers keywords for a category, mode is one of exact (whole message), substring, word (delimited by non-letters) or spaceless (substring ignoring spaces)
+	def add(self, category: str, keywords: Iterable[str], mode: str = 'substring') -> 'TriggerEngine':
+		if mode not in modes:
+			raise ValueError(f'Unknown trigger mode: {mode}')
+		self.triggers += [(category, keyword.lower().replace(' ', '') if mode == 'spaceless' else keyword.lower(), mode) for keyword in keywords if keyword]
+		return self
+
+	# Builds the matchers, has to run after the last add
+	def compile(self) -> 'TriggerEngine':
+		self.exact = {}
+		for trigger in self.triggers:
+			if trigger[2] == 'exact':
+				self.exact.setdefault(trigger[1], []).append(trigger)
+
+		spaced = [trigger for trigger in self.triggers if trigger[2] in ('substring', 'word')]
+		spaceless = [trigger for trigger in self.triggers if trigger[2] == 'spaceless']
+		self.implied = {keyword: [trigger for trigger in spaced if keyword.startswith(trigger[1])] for keyword in {trigger[1] for trigger in spaced}}
+		self.spaceless_implied = {keyword: [trigger for trigger in spaceless if keyword.startswith(trigger[1])] for keyword in {trigger[1] for trigger in spaceless}}
+		self.pattern = compile_keywords(trigger[1] for trigger in spaced)
+		self.spaceless_pattern = compile_keywords(trigger[1] for trigger in spaceless)
+
+		log.debug(f'Compiled {len(self.triggers)} triggers')
+		return self
+
+	# Returns every category hit in content with the keywords that hit, content is expected to be lowercase
+	def scan(self, content: str, spaceless: Optional[str] = None) -> Dict[str, List[str]]:
+		hits: Dict[str, List[str]] = {}
+		for category, keyword, _ in self.exact.get(content, ()):
+			hits.setdefault(category, []).append(keyword)
+
+		if self.pattern:
+			for match in find_overlapping(self.pattern, content):
+				start = match.start()
+				for category, keyword, mode in self.implied[match.group()]:
+					if mode == 'substring' or is_word(content, start, start + len(keyword)):
+						hits.setdefault(category, []).append(keyword)
+
+		if self.spaceless_pattern:
+			spaceless = content.replace(' ', '') if spaceless is None else spaceless
+			for match in find_overlapping(self.spaceless_pattern, spaceless):
+				for category, keyword, _ in self.spaceless_implied[match.group()]:
+					hits.setdefault(category, []).append(keyword)
+
+		return hits
@@ -0,0 +1,66 @@
+from typing import Iterable, Iterator, Sequence
+
+# -------------------------> Globals
+
+message_limit = 2000  # Characters discord allows in one message
+max_map_variables = 6  # Larger maps stop being readable, even stacked
+
+# -------------------------> Functions
+
+# Reflected binary code of i, neighbours differ in exactly one bit
+def gray(i: int) -> int:
+	return i ^ (i >> 1)
+
+# Lines of a truth table, one per row, produced only once they are read
+def table_lines(variables: Sequence[str], header: str, vectors: Sequence[int]) -> Iterator[str]:
+	yield f'{" ".join(variables)} │ {header}'
+	yield f'{"─" * len(variables) * 2}┼{"─" * len(header) * 2}'
+	for row in range(1 << len(variables)):
+		perm = ' '.join(str(row >> (len(variables) - 1 - i) & 1) for i in range(len(variables)))
+		yield f'{perm} │' + ''.join(' 1' if vector >> row & 1 else ' 0' for vector in vectors)
+
+# Estimated size of a table in characters, to decide between messages and an attachment without rendering it
+def table_size(variables: Sequence[str], header: str, targets: int) -> int:
+	width = len(variables) * 2 + 1 + max(len(header), targets) * 2  # The separator or a row, whichever is wider
+	return (width + 1) * ((1 << len(variables)) + 2)
+
+# Packs lines into code blocks that each fit in one message, title goes in front of the first one
+def pack(lines: Iterable[str], title: str = '', limit: int = message_limit) -> Iterator[str]:
+	chunk, size = [], len(title) + 6  # Six characters for the code fences
+	for line in lines:
+		if chunk and size + len(line) + 1 > limit:
+			yield title + '```' + '\n'.join(chunk) + '```'
+			chunk, size, title = [], 6, ''
+		chunk.append(line)
+		size += len(line) + 1
+	if chunk:
+		yield title + '```' + '\n'.join(chunk) + '```'
+
+# Lines of a karnaugh map, rows and columns in gray code order so neighbouring cells differ in one variable
+# Maps of 5 and 6 variables are drawn as 2 or 4 stacked maps of the last 4 variables, one per value of the first ones
+def kmap_lines(vector: int, variables: Sequence[str]) -> Iterator[str]:
+	n = len(variables)
+	if n > max_map_variables:
+		raise ValueError(f'Can only draw k-maps with {max_map_variables} or less variables')
+	stack_bits = max(n - 4, 0)
+	row_bits = (n - stack_bits) // 2
+	col_bits = n - stack_bits - row_bits
+	stack_vars, row_vars, col_vars = variables[:stack_bits], variables[stack_bits:stack_bits + row_bits], variables[stack_bits + row_bits:]
+
+	label = f'{"".join(row_vars)}\\{"".join(col_vars)}'
+	width = max(col_bits, 1)
+	for m in range(1 << stack_bits):
+		stack = gray(m)
+		if stack_bits:
+			if m:
+				yield ''
+			yield ', '.join(f'{var} = {stack >> (stack_bits - 1 - i) & 1}' for i, var in enumerate(stack_vars))
+		yield f'{label} │ ' + ' '.join(format(gray(c), f'0{col_bits}b').rjust(width) for c in range(1 << col_bits))
+		yield f'{"─" * (len(label) + 1)}┼{"─" * ((width + 1) * (1 << col_bits))}'
+		for r in range(1 << row_bits):
+			row_label = format(gray(r), f'0{row_bits}b') if row_bits else ''
+			cells = []
+			for c in range(1 << col_bits):
+				index = (stack << (row_bits + col_bits)) | (gray(r) << col_bits) | gray(c)
+				cells.append(str(vector >> index & 1).rjust(width))
+			yield f'{row_label.rjust(len(label))} │ ' + ' '.join(cells)
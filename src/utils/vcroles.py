@@ -0,0 +1,217 @@
+import asyncio
+import json
+import logging
+import time
+from os import path
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from utils.files import atomic_dump
+
+# -------------------------> Globals
+
+# Setup environment
+log = logging.getLogger(__name__)
+retries = 3  # Attempts per API call when discord keeps answering 429
+
+# -------------------------> Classes
+
+# Role changes that bring a guild from its current state to the desired one
+class Plan:
+	def __init__(self):
+		self.create: Dict[int, str] = {}  # channel id -> name of the role it is missing
+		self.delete: Set[int] = set()  # role ids of channels that are empty or gone
+		self.add: Dict[int, int] = {}  # member id -> channel id whose role they should get
+		self.remove: Dict[int, Set[int]] = {}  # member id -> role ids they should lose
+
+	def __len__(self) -> int:
+		return len(self.create) + len(self.delete) + len(set(self.add) | set(self.remove))
+
+	def __repr__(self) -> str:
+		return f'Plan(create={len(self.create)}, delete={len(self.delete)}, add={len(self.add)}, remove={sum(map(len, self.remove.values()))})'
+
+# Channel id -> role id of every guild, persisted so renames and duplicate channel names never need a name match
+class RoleMap:
+	def __init__(self, file_path: Optional[str] = None):
+		self.path = file_path  # None keeps the map in memory only
+		self.guilds: Dict[int, Dict[int, int]] = {}
+		self.dirty = False
+		self.load()
+
+	def __getitem__(self, guild_id: int) -> Dict[int, int]:
+		return self.guilds.setdefault(guild_id, {})
+
+	def load(self) -> None:
+		if not self.path or not path.isfile(self.path):
+			return
+		log.debug(f'Loading {self.path}...')
+		with open(self.path, 'r', encoding='utf-8') as file:
+			for guild_id, channels in json.load(file).items():
+				self.guilds[int(guild_id)] = {int(channel_id): role_id for channel_id, role_id in channels.items()}
+
+	# Writes the map if it changed since the last flush
+	def flush(self) -> bool:
+		if not self.path or not self.dirty:
+			return False
+		atomic_dump(self.path, {str(guild_id): {str(channel_id): role_id for channel_id, role_id in channels.items()} for guild_id, channels in self.guilds.items() if channels})
+		self.dirty = False
+		return True
+
+	# Brings the map of a guild up to date with its channels and roles (id -> name), returns the amount of entries changed
+	# Entries whose channel or role is gone are dropped, channels without an entry adopt an unclaimed role named after them
+	def rebuild(self, guild_id: int, channels: Dict[int, str], roles: Dict[int, str], suffix: str) -> int:
+		mapping, changed = self[guild_id], 0
+		for channel_id, role_id in list(mapping.items()):
+			if channel_id not in channels or role_id not in roles:
+				del mapping[channel_id]
+				changed += 1
+
+		claimed = set(mapping.values())
+		unclaimed = {}  # role name -> role id, first one wins when names repeat
+		for role_id, name in roles.items():
+			if name.endswith(suffix) and role_id not in claimed:
+				unclaimed.setdefault(name, role_id)
+		for channel_id, name in channels.items():
+			if channel_id not in mapping and name + suffix in unclaimed:
+				mapping[channel_id] = unclaimed.pop(name + suffix)
+				changed += 1
+
+		self.dirty |= bool(changed)
+		return changed
+
+	# Drops the entries pointing at a role, returns whether there were any
+	def forget_role(self, guild_id: int, role_id: int) -> bool:
+		mapping = self[guild_id]
+		stale = [channel_id for channel_id, mapped in mapping.items() if mapped == role_id]
+		for channel_id in stale:
+			del mapping[channel_id]
+		self.dirty |= bool(stale)
+		return bool(stale)
+
+# Spaces out the calls of one rate limit bucket and backs off when discord answers 429 anyway
+class RateLimiter:
+	def __init__(self, rate: float, timer: Callable[[], float] = time.monotonic, sleep: Callable[[float], Awaitable[None]] = asyncio.sleep):
+		self.interval = 1 / rate
+		self.timer = timer
+		self.sleep = sleep
+		self.ready: Dict[Hashable, float] = {}  # bucket -> earliest time of its next call
+
+	async def call(self, bucket: Hashable, request: Callable[[], Awaitable]):
+		for attempt in range(retries):
+			wait = self.ready.get(bucket, 0) - self.timer()
+			if wait > 0:
+				await self.sleep(wait)
+			self.ready[bucket] = self.timer() + self.interval
+			try:
+				return await request()
+			except Exception as err:
+				if getattr(err, 'status', None) != 429 or attempt == retries - 1:
+					raise
+				retry_after = getattr(err, 'retry_after', None) or self.interval * 2 ** (attempt + 1)
+				log.warning(f'Rate limited on {bucket}, retrying in {retry_after:.2f}s')
+				self.ready[bucket] = self.timer() + retry_after
+
+# Runs a callback once per key per window, however often the key is marked during that window
+class Debouncer:
+	def __init__(self, callback: Callable[[Hashable], Awaitable[None]], delay: float):
+		self.callback = callback
+		self.delay = delay
+		self.tasks: Dict[Hashable, asyncio.Task] = {}
+
+	def mark(self, key: Hashable) -> None:
+		if key not in self.tasks:
+			self.tasks[key] = asyncio.get_running_loop().create_task(self.run(key))
+
+	async def run(self, key: Hashable) -> None:
+		await asyncio.sleep(self.delay)
+		del self.tasks[key]  # Marks from here on get a window of their own
+		try:
+			await self.callback(key)
+		except Exception as err:
+			log.error(f'Reconciling {key} failed: {err}')
+
+	def cancel(self) -> None:
+		for task in self.tasks.values():
+			task.cancel()
+		self.tasks.clear()
+
+# -------------------------> Functions
+
+# Compares what members should have (the role of the channel they are in) with what they hold
+# mapping: channel id -> role id, occupied: channel id -> role name of every channel with people in it
+# members: member id -> (channel id they are in or None, mapped role ids they hold)
+def plan(mapping: Dict[int, int], occupied: Dict[int, str], members: Dict[int, Tuple[Optional[int], Set[int]]]) -> Plan:
+	result = Plan()
+	result.delete = {role_id for channel_id, role_id in mapping.items() if channel_id not in occupied}
+	result.create = {channel_id: name for channel_id, name in occupied.items() if channel_id not in mapping}
+
+	for member_id, (channel_id, held) in members.items():
+		target = mapping.get(channel_id) if channel_id in occupied else None
+		if channel_id in occupied and target not in held:
+			result.add[member_id] = channel_id
+		stale = held - {target} - result.delete  # Deleting a role takes it from everyone for free
+		if stale:
+			result.remove[member_id] = stale
+	return result
+
+# Reads the occupied channels and the touched members out of a guild, as input for plan
+def observe(guild, mapping: Dict[int, int], touched: Set[int]) -> Tuple[Dict[int, str], Dict[int, Tuple[Optional[int], Set[int]]]]:
+	mapped = set(mapping.values())
+	occupied = {}
+	for channel_id in mapping:
+		channel = guild.get_channel(channel_id)
+		if channel and channel.members:
+			occupied[channel_id] = channel.name
+
+	members = {}
+	for member_id in touched:
+		member = guild.get_member(member_id)
+		if member is None:
+			continue
+		channel = member.voice.channel if member.voice else None
+		if channel:
+			occupied[channel.id] = channel.name
+		members[member_id] = (channel.id if channel else None, {role.id for role in member.roles if role.id in mapped})
+	return occupied, members
+
+# Carries out a plan on a guild, returns the amount of API calls it took
+# Works on anything shaped like a discord guild, which the simulation in benchmarks/ relies on
+async def apply(result: Plan, guild, mapping: Dict[int, int], limiter: RateLimiter, suffix: str) -> int:
+	calls = 0
+	created = {}  # role id -> new role, the guild only caches it once the gateway reports it
+	for channel_id, name in result.create.items():
+		role = await limiter.call(('roles', guild.id), lambda: guild.create_role(name=name + suffix, mentionable=True, reason='Detected a VC which does not have a role.'))
+		created[role.id] = role
+		mapping[channel_id] = role.id
+		calls += 1
+
+	# One call per member, adding and removing at once when they moved
+	for member_id in set(result.add) | set(result.remove):
+		member = guild.get_member(member_id)
+		if member is None:
+			continue
+		remove = result.remove.get(member_id, set())
+		role_id = mapping.get(result.add.get(member_id), 0)
+		role = created.get(role_id) or guild.get_role(role_id)  # Gone if someone deleted it meanwhile
+		add = [role] if role else []
+		if not add and not remove:
+			continue
+		if add and remove:
+			roles = [role for role in member.roles[1:] if role.id not in remove] + add
+			await limiter.call(('members', guild.id), lambda: member.edit(roles=roles, reason='Moved between VCs'))
+		elif add:
+			await limiter.call(('members', guild.id), lambda: member.add_roles(*add, reason='Joined a VC'))
+		else:
+			roles = [role for role in member.roles if role.id in remove]
+			if not roles:
+				continue
+			await limiter.call(('members', guild.id), lambda: member.remove_roles(*roles, reason='Left a VC'))
+		calls += 1
+
+	for role_id in result.delete:
+		role = created.get(role_id) or guild.get_role(role_id)
+		for channel_id in [channel_id for channel_id, mapped in mapping.items() if mapped == role_id]:
+			del mapping[channel_id]
+		if role:
+			await limiter.call(('roles', guild.id), lambda: role.delete(reason=f'Role {role.name} has no current users and was cleaned up'))
+			calls += 1
+	return calls
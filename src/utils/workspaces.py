@@ -0,0 +1,66 @@
+import json
+import logging
+import os
+from os import path
+from typing import Optional, Tuple
+
+from utils.cache import TTLCache
+from utils.files import atomic_dump
+from utils.logic import FunctionGraph
+
+# -------------------------> Globals
+
+# Setup environment
+log = logging.getLogger(__name__)
+Key = Tuple[int, int]  # (guild id, user id), guild 0 for direct messages
+
+# -------------------------> Classes
+
+# Boolean functions of every guild member, workspaces idle for ttl seconds are written to disk and dropped from memory
+class WorkspaceStore:
+	def __init__(self, maxsize: int = 256, ttl: Optional[float] = 60 * 60, directory: Optional[str] = 'storage/db/boolean'):
+		self.directory = directory  # None keeps workspaces in memory only
+		self.workspaces: TTLCache[Key, FunctionGraph] = TTLCache(maxsize, ttl, on_evict=self.save, sliding=True)  # ttl counts from the last use
+
+	def file_path(self, key: Key) -> str:
+		return path.join(self.directory, str(key[0]), f'{key[1]}.json')
+
+	# Returns the workspace of a member, read back from disk if it was persisted earlier
+	def __getitem__(self, key: Key) -> FunctionGraph:
+		graph = self.workspaces.get(key)
+		if graph is None:
+			graph = self.load(key)
+			self.workspaces[key] = graph
+		return graph
+
+	def load(self, key: Key) -> FunctionGraph:
+		if not self.directory or not path.isfile(self.file_path(key)):
+			return FunctionGraph()
+		log.debug(f'Loading boolean workspace {self.file_path(key)}...')
+		try:
+			with open(self.file_path(key), 'r', encoding='utf-8') as file:
+				return FunctionGraph.from_json(json.load(file))
+		except (OSError, ValueError) as err:
+			log.error(f'Could not load boolean workspace {self.file_path(key)}: {err}')
+			return FunctionGraph()
+
+	# Writes a workspace if it changed since it was last written, returns whether it did
+	def save(self, key: Key, graph: FunctionGraph) -> bool:
+		if not self.directory or not graph.dirty:
+			return False
+		try:
+			os.makedirs(path.dirname(self.file_path(key)), exist_ok=True)
+			if graph.functions:
+				atomic_dump(self.file_path(key), graph.to_json(), None)
+			elif path.isfile(self.file_path(key)):
+				os.remove(self.file_path(key))  # Cleared workspaces leave nothing behind
+		except OSError as err:
+			log.error(f'Could not save boolean workspace {self.file_path(key)}: {err}')
+			return False
+		graph.dirty = False
+		return True
+
+	# Writes every changed workspace and drops the expired ones, returns the amount written
+	def flush(self) -> int:
+		self.workspaces.expire()
+		return sum(self.save(key, graph) for key, (_, graph) in list(self.workspaces.data.items()))